@@ -0,0 +1,109 @@
+"""
+Text editor frame time benchmark
+
+Draws a highlighted Python file of 100 to 10M lines scrolled to the middle
+and fails when the frame time grows with the number of lines, since a
+frame should only cost the lines that are on the screen. Run it from the
+main folder with:
+
+    python benchmarks/editor_draw.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+# pylint: disable=wrong-import-position
+from src.terminal import Screen
+from src.reactor import Reactor
+from src.metrics import Metrics
+from src.words import WordIndex
+from src.edit import TextEditor
+from src.extensions.default_syntaxes import Extension
+
+SIZES = (100, 10_000, 1_000_000, 10_000_000)
+FRAMES = 300
+# How many times slower than with the fewest lines a frame may be
+MAX_GROWTH = 3.0
+# Lines are repeated from a pool so the text is built quickly
+POOL_SIZE = 100
+
+
+class BenchmarkWindow():
+    """The parts of a window the text editor draws with"""
+    terminal_cols = 100
+    terminal_lines = 40
+
+    def __init__(self):
+        self.screen = Screen(self.terminal_cols, self.terminal_lines)
+        self.reactor = Reactor()
+        self.metrics = Metrics(FRAMES)
+        self.words = WordIndex()
+        self.extension_commands = Extension().commands
+        self.language_service = None
+        self.project_path = os.getcwd()
+
+    def move_cursor(self, left, top):
+        """Moves position of the next write"""
+        self.screen.move(left, top)
+
+    def write(self, text):
+        """Writes text to the next frame"""
+        self.screen.write(text)
+
+    def invalidate(self):
+        """Frames are drawn by the benchmark"""
+
+    def request_redraw(self):
+        """Frames are drawn by the benchmark"""
+
+
+def frame_time(size):
+    """
+    Returns the median time of a frame of the text editor with `size`
+    lines, moving the cursor a line down and back up every other frame
+    """
+    pool = [f'value_{i} = compute({i}, "two")  # comment {i}\n'
+            for i in range(POOL_SIZE)]
+    text = (''.join(pool) * (size // POOL_SIZE)
+            + ''.join(pool[:size % POOL_SIZE]))[:-1]
+    window = BenchmarkWindow()
+    try:
+        editor = TextEditor(window, 'benchmark.py', text)
+        editor.line_index = size // 2
+        editor.__draw__()
+        times = []
+        for frame in range(FRAMES):
+            if frame % 2 == 0:
+                editor.down_keypress()
+            else:
+                editor.up_keypress()
+            start = time.perf_counter()
+            window.screen.clear()
+            editor.__draw__()
+            window.screen.render()
+            times.append(time.perf_counter() - start)
+    finally:
+        window.reactor.close()
+    return statistics.median(times)
+
+
+def main():
+    """Measures every size and returns the exit status"""
+    times = [frame_time(size) for size in SIZES]
+    for size, seconds in zip(SIZES, times):
+        print(f'{size:>12,} lines  {seconds * 1000:.3f} ms per frame')
+    growth = max(times) / times[0]
+    if growth > MAX_GROWTH:
+        print(f'FAIL: frames are {growth:.1f} times slower with more lines')
+        return 1
+    print(f'OK: frames are at most {growth:.1f} times slower')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
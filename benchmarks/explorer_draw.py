@@ -0,0 +1,100 @@
+"""
+Explorer frame time benchmark
+
+Draws the Explorer scrolled to the middle of directories of 100 to 10M
+entries and fails when the frame time grows with the number of entries,
+since a frame should only cost the entries that are on the screen. Run it
+from the main folder with:
+
+    python benchmarks/explorer_draw.py
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__
+))))
+
+# pylint: disable=wrong-import-position
+from src.terminal import Screen
+from src.extensions.explorer_page import Explorer
+
+SIZES = (100, 10_000, 1_000_000, 10_000_000)
+FRAMES = 300
+# How many times slower than with the fewest entries a frame may be
+MAX_GROWTH = 3.0
+# Entries are repeated from a pool so 10M of them fit in memory
+POOL_SIZE = 1000
+
+
+class BenchmarkWindow():
+    """The parts of a window the Explorer draws with"""
+    terminal_cols = 100
+    terminal_lines = 40
+
+    def __init__(self):
+        self.screen = Screen(self.terminal_cols, self.terminal_lines)
+
+    def move_cursor(self, left, top):
+        """Moves position of the next write"""
+        self.screen.move(left, top)
+
+    def write(self, text):
+        """Writes text to the next frame"""
+        self.screen.write(text)
+
+    def request_redraw(self):
+        """Frames are drawn by the benchmark"""
+
+
+def frame_time(path, size):
+    """
+    Returns the median time of a frame of the Explorer with `size` entries,
+    moving the selection a line down and back up every other frame
+    """
+    pool = [(True, f'file_{i:06}.txt', f'file_{i:06}.txt')
+            for i in range(POOL_SIZE)]
+    entries = pool * (size // POOL_SIZE) + pool[:size % POOL_SIZE]
+    Explorer.listings[path] = (os.stat(path).st_mtime_ns, entries)
+    window = BenchmarkWindow()
+    explorer = Explorer(window)
+    explorer.selected_file = size // 2
+    times = []
+    for frame in range(FRAMES):
+        if frame % 2 == 0:
+            explorer.down_key_press()
+        else:
+            explorer.up_key_press()
+        start = time.perf_counter()
+        window.screen.clear()
+        explorer.__draw__()
+        window.screen.render()
+        times.append(time.perf_counter() - start)
+    Explorer.listings.clear()
+    return statistics.median(times)
+
+
+def main():
+    """Measures every size and returns the exit status"""
+    with tempfile.TemporaryDirectory() as path:
+        old_path = os.getcwd()
+        os.chdir(path)
+        try:
+            times = [frame_time(os.getcwd(), size) for size in SIZES]
+        finally:
+            os.chdir(old_path)
+    for size, seconds in zip(SIZES, times):
+        print(f'{size:>12,} entries  {seconds * 1000:.3f} ms per frame')
+    growth = max(times) / times[0]
+    if growth > MAX_GROWTH:
+        print(f'FAIL: frames are {growth:.1f} times slower with more entries')
+        return 1
+    print(f'OK: frames are at most {growth:.1f} times slower')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,7 @@
 """StrawBerryEdit"""
 from .window import Window
 
-window = Window()
+if __name__ == '__main__':
+    window = Window()
 
-window.main_loop()
+    window.main_loop()
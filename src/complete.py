@@ -0,0 +1,147 @@
+"""Auto completion"""
+from .service import RemoteCommand
+from .settings import CONFIGS
+
+
+class Completion():
+    """
+    A suggestion, it has the attributes of jedi completions that the
+    editor uses
+    """
+    def __init__(self, name, complete, type):
+        self.name = name
+        self.complete = complete
+        self.type = type
+
+    def __repr__(self):
+        return f'<Completion: {self.name}>'
+
+
+def word_start(text, char):
+    """Returns where the name that ends at `char` of a line starts"""
+    start = char
+    while start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'):
+        start -= 1
+    return start
+
+
+def narrow(completions, word):
+    """
+    Returns the completions whose names start with `word`, the ones that
+    match its case first
+    """
+    lower_word = word.lower()
+    exact = []
+    others = []
+    for completion in completions:
+        if completion.name.startswith(word):
+            exact.append(completion)
+        elif completion.name.lower().startswith(lower_word):
+            others.append(completion)
+    return [Completion(i.name, i.name[len(word):], i.type)
+            for i in exact + others]
+
+
+class CompletionService():
+    """
+    Asks an `editor.auto_complete` command for suggestions when the text
+    changes
+
+    Edits that come faster than `editor.completion_delay` seconds are
+    merged into one request. Only one request runs at a time; a newer edit
+    cancels a request that has not started yet, and the result of one that
+    has already started is dropped because it is made from an old version
+    of the document.
+
+    The suggestions are kept with the place where the name they complete
+    starts. While the name is typed on, the kept suggestions are narrowed
+    to the ones that start with it instead of asking the completer again.
+    """
+    def __init__(self, reactor, completer, document, path, callback):
+        self.reactor = reactor
+        self.completer = completer
+        self.document = document
+        self.path = path
+        self.callback = callback
+
+        self.position = None
+        self.timer = None
+        self.future = None
+        self.is_pending = False
+        self.cached = None
+
+    def anchor(self, line, char):
+        """
+        Returns where the name before a position starts with what comes
+        before it, and the name
+        """
+        text = self.document.line(line)
+        start = word_start(text, char)
+        return ((line, start, text[:start], self.document.line_count()),
+                text[start:char])
+
+    def request(self, line, char):
+        """Asks for suggestions at a position once the typing pauses"""
+        anchor, word = self.anchor(line, char)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.future is not None:
+            self.future.cancel()
+        if (self.cached is not None and self.cached[0] == anchor
+                and word.startswith(self.cached[1])):
+            self.position = None
+            self.callback(narrow(self.cached[2], word))
+            return
+        self.position = (line, char)
+        self.timer = self.reactor.call_later(
+            CONFIGS['editor.completion_delay'], self.run
+        )
+
+    def cancel(self):
+        """Forgets the last request and the kept suggestions"""
+        self.position = None
+        self.cached = None
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.future is not None:
+            self.future.cancel()
+
+    def run(self):
+        """Starts the last request now"""
+        self.timer = None
+        if self.position is None:
+            return
+        if self.future is not None:
+            self.is_pending = True
+            return
+        version = self.document.version
+        line, char = self.position
+        if isinstance(self.completer, RemoteCommand):
+            self.future = self.completer.submit(self.document, char + 1,
+                                                line + 1, path=self.path)
+        else:
+            self.future = self.reactor.run_in_background(
+                self.complete, self.document.snapshot(), line, char
+            )
+        self.reactor.watch_future(self.future,
+                                  lambda done: self.done(version, done))
+
+    def complete(self, snapshot, line, char):
+        """Runs the completer on a snapshot, called on a worker thread"""
+        return self.completer(snapshot.to_string(), char + 1, line + 1,
+                              path=self.path)
+
+    def done(self, version, future):
+        """Passes the suggestions to the callback if they are not stale"""
+        self.future = None
+        if self.is_pending is True:
+            self.is_pending = False
+            self.run()
+        if (future.cancelled() is False and future.exception() is None
+                and self.position is not None
+                and version == self.document.version):
+            anchor, word = self.anchor(*self.position)
+            self.cached = (anchor, word, future.result())
+            self.callback(future.result())
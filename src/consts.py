@@ -7,6 +7,10 @@ SPACE = "\x20"
 ESC = "\x1b"
 TAB = "\x09"
 
+# Bracketed paste
+PASTE_START = "\x1b[200~"
+PASTE_END = "\x1b[201~"
+
 CTRL_A = "\x01"
 CTRL_B = "\x02"
 CTRL_C = "\x03"
@@ -0,0 +1,50 @@
+"""Problems found in a document"""
+from bisect import bisect_left, bisect_right
+
+
+class Diagnostics():
+    """
+    Problems of a document, at most one per line
+
+    The lines that have a problem are kept sorted next to their messages,
+    so the problem of a line is found with a binary search. When lines are
+    added or removed the problems after them move with their lines until
+    the next linter result replaces them.
+    """
+    def __init__(self):
+        self.lines = []
+        self.messages = []
+
+    def get(self, line):
+        """Returns the problem of a line or None"""
+        index = bisect_left(self.lines, line)
+        if index < len(self.lines) and self.lines[index] == line:
+            return self.messages[index]
+        return None
+
+    def replace(self, problems):
+        """
+        Replaces the problems with a dict of line to message and returns
+        the lines whose problem has changed
+        """
+        old_problems = dict(zip(self.lines, self.messages))
+        self.lines = sorted(problems)
+        self.messages = [problems[line] for line in self.lines]
+        return {line for line, _ in
+                set(problems.items()) ^ set(old_problems.items())}
+
+    def lines_changed(self, line, removed, added):
+        """
+        Moves the problems after lines `line` to `line + removed`, which are
+        now lines `line` to `line + added`, and forgets the problems of the
+        lines that were joined into `line`
+        """
+        if removed == 0 and added == 0:
+            return
+        start = bisect_right(self.lines, line)
+        end = bisect_right(self.lines, line + removed)
+        shift = added - removed
+        del self.lines[start:end]
+        del self.messages[start:end]
+        for index in range(start, len(self.lines)):
+            self.lines[index] += shift
@@ -0,0 +1,582 @@
+"""Document model"""
+import mmap
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+# A mapped file keeps the offset of every LINE_STEP th line start
+LINE_STEP = 64
+LINE_STEPS = re.compile(b'(?:[^\\n]*\\n){%d}' % LINE_STEP)
+INDEX_CHUNK = 16 * 1024 * 1024
+# The first chunk is smaller, it holds the lines of the first page
+FIRST_INDEX_CHUNK = 256 * 1024
+LINE_CACHE_SIZE = 4096
+# Appended text is copied onto the last chunk of a buffer up to this length
+CHUNK_SIZE = 64 * 1024
+
+
+class TextBuffer():
+    """
+    Append-only text storage that the pieces of a `Document` point into,
+    it holds str or, for documents of mapped files, bytes
+
+    The text is kept in chunks. Short appends are copied onto the last
+    chunk while it is shorter than `CHUNK_SIZE` and longer ones start a
+    new chunk, so an append costs the length of its text and not of the
+    buffer. A chunk is only ever replaced by a longer copy of itself, so
+    snapshots can read the buffer on other threads while it grows.
+    """
+    is_indexed = True
+
+    def __init__(self, text='', newline='\n'):
+        self.chunks = [text]
+        self.starts = [0]
+        self.length = len(text)
+        self.newline = newline
+        self.newlines = array('q')
+        self._index_newlines(text, 0)
+
+    def __len__(self):
+        return self.length
+
+    def _index_newlines(self, text, offset):
+        find = text.find
+        newline = self.newline
+        position = find(newline)
+        while position != -1:
+            self.newlines.append(offset + position)
+            position = find(newline, position + 1)
+
+    def append(self, text):
+        """Appends text and returns the offset where it starts"""
+        start = self.length
+        last = self.chunks[-1]
+        if len(last) + len(text) <= CHUNK_SIZE:
+            self.chunks[-1] = last + text
+        else:
+            self.chunks.append(text)
+            self.starts.append(start)
+        self.length += len(text)
+        self._index_newlines(text, start)
+        return start
+
+    def slice(self, start, end):
+        """Returns the text between two offsets"""
+        if start >= end:
+            return self.chunks[0][:0]
+        starts = self.starts
+        index = bisect_right(starts, start) - 1
+        chunk = self.chunks[index]
+        offset = starts[index]
+        if end - offset <= len(chunk):
+            return chunk[start - offset:end - offset]
+        parts = []
+        while start < end:
+            chunk = self.chunks[index]
+            offset = starts[index]
+            parts.append(chunk[start - offset:end - offset])
+            start = offset + len(chunk)
+            index += 1
+        return chunk[:0].join(parts)
+
+    def newline_count(self, start, end):
+        """Returns the number of newlines between two offsets"""
+        return (bisect_left(self.newlines, end)
+                - bisect_left(self.newlines, start))
+
+    def nth_newline(self, start, number):
+        """Returns the offset of the `number`th newline after `start`"""
+        return self.newlines[bisect_left(self.newlines, start) + number - 1]
+
+
+class MappedBuffer():
+    """
+    Read-only memory-mapped file that the pieces of a `Document` point into
+
+    Only the start of every `LINE_STEP`th line is kept in `line_starts`,
+    the lines in between are found by scanning the mapped bytes. `index`
+    builds it chunk by chunk on a worker thread, and until it is done the
+    newlines after `indexed`, the start of the last line it has found, are
+    not counted.
+    """
+    def __init__(self, path, encoding):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.line_starts = array('q', [0])
+        self.indexed = 0
+        self.scanned = 0
+        # Newlines that have been scanned after the last kept line start
+        self.step_lines = 0
+        self.is_indexed = False
+
+    def __len__(self):
+        return len(self.map)
+
+    def index(self, progress=None):
+        """
+        Indexes the lines of the file chunk by chunk, `progress` is called
+        after every chunk and stops the indexing by returning False
+
+        The first chunk is small so the first page can be shown soon.
+        """
+        size = len(self.map)
+        while self.is_indexed is False:
+            chunk_start = self.scanned
+            self.scanned = min(size, chunk_start + (
+                INDEX_CHUNK if chunk_start > 0 else FIRST_INDEX_CHUNK
+            ))
+            line_start = self._index_chunk(chunk_start, self.scanned)
+            self.release(chunk_start, self.scanned)
+            if self.scanned == size:
+                self.indexed = size
+                self.is_indexed = True
+            elif line_start is not None:
+                self.indexed = line_start
+            if progress is not None and progress() is False:
+                break
+
+    def _index_chunk(self, position, end):
+        """
+        Keeps the line starts of a chunk, a step of lines is matched at once
+        and the newlines of a step that does not fit in the chunk are found
+        one at a time, so every byte is only scanned a bounded number of
+        times however long the lines are
+
+        Returns the start of the last line found in the chunk, or None.
+        """
+        match_step = LINE_STEPS.match
+        find = self.map.find
+        step_lines = self.step_lines
+        line_start = None
+        while True:
+            if step_lines == 0:
+                match = match_step(self.map, position, end)
+                if match is not None:
+                    position = line_start = match.end()
+                    self.line_starts.append(position)
+                    continue
+            newline = find(b'\n', position, end)
+            if newline == -1:
+                break
+            position = line_start = newline + 1
+            step_lines += 1
+            if step_lines == LINE_STEP:
+                self.line_starts.append(position)
+                step_lines = 0
+        self.step_lines = step_lines
+        return line_start
+
+    def release(self, start, end):
+        """Lets the system drop the pages of a range that has been read"""
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            start -= start % mmap.PAGESIZE
+            self.map.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    def _newlines_before(self, offset):
+        index = bisect_right(self.line_starts, offset) - 1
+        start = self.line_starts[index]
+        return index * LINE_STEP + self.map[start:offset].count(b'\n')
+
+    def _line_start(self, line):
+        position = self.line_starts[line // LINE_STEP]
+        find = self.map.find
+        for _ in range(line % LINE_STEP):
+            position = find(b'\n', position) + 1
+        return position
+
+    def slice(self, start, end):
+        """Returns the bytes between two offsets"""
+        return self.map[start:end]
+
+    def newline_count(self, start, end):
+        """Returns the number of indexed newlines between two offsets"""
+        end = min(end, self.indexed)
+        if start >= end:
+            return 0
+        return self._newlines_before(end) - self._newlines_before(start)
+
+    def nth_newline(self, start, number):
+        """Returns the offset of the `number`th newline after `start`"""
+        return self._line_start(self._newlines_before(start) + number) - 1
+
+
+
+class Document():
+    """
+    Piece table holding the text of a file
+
+    The original text is never copied or modified, edits only append to
+    `added` and rearrange the list of pieces. A piece is a tuple of
+    (buffer, start, end, newline count) and the cumulative lengths and
+    newline counts of the pieces are cached so offsets and lines can be
+    found with a binary search. Every edit passes the ranges of pieces that
+    undo it to `history`, when there is one.
+
+    A document made from a `MappedBuffer` counts offsets in bytes of its
+    `encoding` and only decodes the lines that are asked for; otherwise
+    `encoding` is None and offsets count characters.
+    """
+    def __init__(self, text=''):
+        if isinstance(text, MappedBuffer):
+            self.original = text
+            self.added = TextBuffer(b'', b'\n')
+            self.encoding = text.encoding
+        else:
+            self.original = TextBuffer(text)
+            self.added = TextBuffer()
+            self.encoding = None
+        self.pieces = []
+        if len(self.original) > 0:
+            self.pieces.append(self._piece(self.original, 0,
+                                           len(self.original)))
+
+        self._ends = []
+        self._line_ends = []
+        self._indexed = 0
+        self._line_cache = {}
+
+        self.version = 0
+        self.history = None
+
+    @staticmethod
+    def _piece(buffer, start, end):
+        return (buffer, start, end, buffer.newline_count(start, end))
+
+    def _update_index(self):
+        """Recalculates the cached sums of the pieces that changed"""
+        if self._indexed == len(self.pieces):
+            return
+        if self._indexed > 0:
+            end = self._ends[-1]
+            lines = self._line_ends[-1]
+        else:
+            end = lines = 0
+        for _, start, stop, newlines in self.pieces[self._indexed:]:
+            end += stop - start
+            lines += newlines
+            self._ends.append(end)
+            self._line_ends.append(lines)
+        self._indexed = len(self.pieces)
+
+    def _forget_sums(self, piece_index):
+        self._indexed = min(self._indexed, piece_index)
+        del self._ends[self._indexed:]
+        del self._line_ends[self._indexed:]
+
+    def _changed(self, piece_index):
+        self._forget_sums(piece_index)
+        self._line_cache.clear()
+        self.version += 1
+
+    def _newline_total(self):
+        self._update_index()
+        return self._line_ends[-1] if self._line_ends else 0
+
+    def __len__(self):
+        self._update_index()
+        return self._ends[-1] if self._ends else 0
+
+    def original_indexed(self):
+        """
+        Counts the newlines of the original pieces again after a mapped
+        original buffer was indexed further
+        """
+        for index, piece in enumerate(self.pieces):
+            if piece[0] is self.original:
+                new_piece = self._piece(*piece[:3])
+                if new_piece[3] != piece[3]:
+                    self.pieces[index] = new_piece
+                    self._forget_sums(index)
+
+    def line_count(self):
+        """
+        Returns number of lines, while a mapped file is being indexed the
+        line after the last indexed newline is not counted
+        """
+        if self.original.is_indexed is False:
+            return max(1, self._newline_total())
+        return self._newline_total() + 1
+
+    def line_start(self, line):
+        """Returns offset of the first character of a line"""
+        if line == 0:
+            return 0
+        self._update_index()
+        index = bisect_left(self._line_ends, line)
+        if index == len(self.pieces):
+            raise IndexError('line index out of range')
+        buffer, start, _, _ = self.pieces[index]
+        piece_start = self._ends[index - 1] if index > 0 else 0
+        newlines_before = self._line_ends[index - 1] if index > 0 else 0
+        newline = buffer.nth_newline(start, line - newlines_before)
+        return piece_start + newline - start + 1
+
+    def line(self, line):
+        """Returns text of a line without its line break"""
+        try:
+            return self._line_cache[line]
+        except KeyError:
+            pass
+        start = self.line_start(line)
+        if line < self._newline_total():
+            end = self.line_start(line + 1) - 1
+        elif self.original.is_indexed is True:
+            end = len(self)
+        else:
+            # The end of the line has not been indexed yet
+            return ''
+        text = self.text(start, end)
+        if len(self._line_cache) >= LINE_CACHE_SIZE:
+            self._line_cache.clear()
+        self._line_cache[line] = text
+        return text
+
+    def line_length(self, line):
+        """Returns number of characters in a line"""
+        return len(self.line(line))
+
+    def lines(self, start, stop):
+        """Yields the lines between two line numbers"""
+        for line in range(start, min(stop, self.line_count())):
+            yield self.line(line)
+
+    def offset(self, line, char):
+        """Converts a line and character index to an offset"""
+        if self.encoding is None:
+            return self.line_start(line) + char
+        return self.line_start(line) + len(
+            self.line(line)[:char].encode(self.encoding)
+        )
+
+    def position(self, offset):
+        """Converts an offset to a line and character index"""
+        self._update_index()
+        index = bisect_right(self._ends, offset)
+        if index == len(self.pieces):
+            line = self.line_count() - 1
+        else:
+            buffer, start, _, _ = self.pieces[index]
+            piece_start = self._ends[index - 1] if index > 0 else 0
+            line = ((self._line_ends[index - 1] if index > 0 else 0)
+                    + buffer.newline_count(start,
+                                           start + offset - piece_start))
+        if self.encoding is None:
+            return line, offset - self.line_start(line)
+        return line, len(self.text(self.line_start(line), offset))
+
+    def text(self, start=0, end=None):
+        """Returns the text between two offsets"""
+        if self.encoding is None:
+            return self.slice(start, end)
+        return self.slice(start, end).decode(self.encoding, 'replace')
+
+    def slice(self, start=0, end=None):
+        """
+        Returns what the buffers hold between two offsets, which is bytes
+        for a mapped document
+        """
+        self._update_index()
+        if end is None:
+            end = len(self)
+        parts = []
+        index = bisect_right(self._ends, start)
+        piece_start = self._ends[index - 1] if index > 0 else 0
+        for buffer, begin, stop, _ in self.pieces[index:]:
+            if piece_start >= end:
+                break
+            parts.append(buffer.slice(begin + max(0, start - piece_start),
+                                      begin + min(stop - begin,
+                                                  end - piece_start)))
+            piece_start += stop - begin
+        if self.encoding is None:
+            return ''.join(parts)
+        return b''.join(parts)
+
+    def chunks(self, encoding, size):
+        """
+        Yields the text in chunks of at most `size` offsets as (bytes,
+        number of offsets) pairs, encoded with `encoding` unless the
+        document already holds bytes
+        """
+        for buffer, start, end, _ in self.pieces:
+            for chunk_start in range(start, end, size):
+                chunk_end = min(end, chunk_start + size)
+                chunk = buffer.slice(chunk_start, chunk_end)
+                if self.encoding is None:
+                    chunk = chunk.encode(encoding)
+                yield chunk, chunk_end - chunk_start
+                if isinstance(buffer, MappedBuffer):
+                    buffer.release(chunk_start, chunk_end)
+
+    def snapshot(self):
+        """
+        Returns a copy of the document that later edits do not change, it
+        shares the buffers because they are only ever appended to
+        """
+        snapshot = Document()
+        snapshot.original = self.original
+        snapshot.added = self.added
+        snapshot.encoding = self.encoding
+        snapshot.pieces = list(self.pieces)
+        snapshot.version = self.version
+        return snapshot
+
+    def to_string(self):
+        """Returns the whole text"""
+        return self.text()
+
+    def insert(self, offset, text):
+        """Inserts text at an offset"""
+        if text == '':
+            return
+        if self.encoding is not None:
+            text = text.encode(self.encoding)
+        self._update_index()
+        index = bisect_right(self._ends, offset)
+        piece_start = self._ends[index - 1] if index > 0 else 0
+        added = self.added
+        if (offset == piece_start and index > 0
+                and self.pieces[index - 1][0] is added
+                and self.pieces[index - 1][2] == len(added)):
+            # Typing right after the last insertion just grows that piece
+            added.append(text)
+            index -= 1
+            self.pieces[index] = self._piece(added, self.pieces[index][1],
+                                             len(added))
+        else:
+            start = added.append(text)
+            new_piece = self._piece(added, start, len(added))
+            if offset == piece_start:
+                self.pieces.insert(index, new_piece)
+            else:
+                buffer, begin, end, _ = self.pieces[index]
+                middle = begin + offset - piece_start
+                self.pieces[index:index + 1] = [
+                    self._piece(buffer, begin, middle), new_piece,
+                    self._piece(buffer, middle, end)
+                ]
+        self._changed(index)
+        self._record([(offset, offset + len(text), [])])
+
+    def delete(self, start, end):
+        """Deletes the text between two offsets and returns it"""
+        end = min(end, len(self))
+        if start >= end:
+            return ''
+        removed = self.text(start, end)
+        self._record(self.splice([(start, end, [])]))
+        return removed
+
+    def replace_ranges(self, ranges):
+        """
+        Replaces the text between many pairs of offsets in one edit,
+        `ranges` is a sorted list of (start, end, text) that do not overlap
+
+        The same new text is added to the buffer once and shared by all the
+        ranges it replaces.
+        """
+        if not ranges:
+            return
+        added = self.added
+        texts = {'': []}
+        spliced = []
+        for start, end, text in ranges:
+            if text not in texts:
+                data = (text if self.encoding is None
+                        else text.encode(self.encoding))
+                texts[text] = [self._piece(added, added.append(data),
+                                           len(added))]
+            spliced.append((start, end, texts[text]))
+        self._record(self.splice(spliced))
+
+    def splice(self, ranges):
+        """
+        Replaces the text between many pairs of offsets with lists of
+        pieces in one pass, `ranges` is a sorted list of (start, end,
+        pieces) that do not overlap
+
+        Returns the range that undoes the edit, which holds the old pieces
+        from the start of the first range to the end of the last one, so
+        the text is never copied.
+        """
+        old_pieces = self.pieces_between(ranges[0][0], ranges[-1][1])
+        pieces = self.pieces
+        ends = self._ends
+        count = len(pieces)
+        first = bisect_right(ends, ranges[0][0])
+        index = first
+        piece_start = ends[first - 1] if first > 0 else 0
+        # The start of the piece at `index` that has not been used yet
+        begin = pieces[index][1] if index < count else 0
+        new_pieces = []
+        shift = 0
+        for start, end, inserted in ranges:
+            # Keeps the text before the range
+            if start > piece_start:
+                start_index = bisect_right(ends, start)
+                if start_index > index:
+                    piece = pieces[index]
+                    new_pieces.append(piece if begin == piece[1] else
+                                      self._piece(piece[0], begin, piece[2]))
+                    new_pieces += pieces[index + 1:start_index]
+                    index = start_index
+                    piece_start = ends[index - 1]
+                    begin = pieces[index][1] if index < count else 0
+                if index < count and piece_start < start:
+                    middle = begin + start - piece_start
+                    new_pieces.append(self._piece(pieces[index][0], begin,
+                                                  middle))
+                    begin, piece_start = middle, start
+            # Skips the text of the range
+            if end > piece_start:
+                index = bisect_right(ends, end)
+                if index < count:
+                    begin = pieces[index][1] + end - (ends[index - 1]
+                                                      if index > 0 else 0)
+                piece_start = end
+            if len(inserted) == 1:
+                new_pieces.append(inserted[0])
+                shift += inserted[0][2] - inserted[0][1] - (end - start)
+            else:
+                new_pieces += inserted
+                shift += sum(piece[2] - piece[1]
+                             for piece in inserted) - (end - start)
+        last = index
+        if index < count and begin != pieces[index][1]:
+            # Keeps the rest of the piece the last range ended in
+            new_pieces.append(self._piece(pieces[index][0], begin,
+                                          pieces[index][2]))
+            last += 1
+        pieces[first:last] = new_pieces
+        self._changed(first)
+        return [(ranges[0][0], ranges[-1][1] + shift, old_pieces)]
+
+    def pieces_between(self, start, end):
+        """Returns the pieces of the text between two offsets"""
+        self._update_index()
+        if start >= end:
+            return []
+        first = bisect_right(self._ends, start)
+        last = bisect_left(self._ends, end)
+        result = self.pieces[first:last + 1]
+        first_start = self._ends[first - 1] if first > 0 else 0
+        last_end = self._ends[last]
+        if first == last:
+            buffer, begin, _, _ = result[0]
+            result[0] = self._piece(buffer, begin + start - first_start,
+                                    begin + end - first_start)
+            return result
+        if start > first_start:
+            buffer, begin, stop, _ = result[0]
+            result[0] = self._piece(buffer, begin + start - first_start,
+                                    stop)
+        if end < last_end:
+            buffer, begin, stop, _ = result[-1]
+            result[-1] = self._piece(buffer, begin, stop - last_end + end)
+        return result
+
+    def _record(self, inverse):
+        if self.history is not None:
+            self.history.record(inverse)
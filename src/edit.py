@@ -1,13 +1,25 @@
 """
 Main text editor
 """
+import os
 import pathlib
-import threading
+import time
 
 from pyperclip import paste
 from pygments.formatters import Terminal256Formatter, TerminalFormatter
 
 from .page import Page
+from .menus import ask_save_path
+from .document import Document, MappedBuffer
+from .highlight import Highlighter
+from .lint import LintScheduler
+from .complete import Completion, CompletionService, word_start
+from .diagnostics import Diagnostics
+from .service import RemoteCommand
+from .save import FileSaver
+from .search import TextSearch
+from .undo import UndoHistory
+from .words import DocumentWords
 from .consts import (
     BACKSPACE, ENTER, LF, CR
 )
@@ -17,6 +29,11 @@ from .settings import (
     EDITOR_KEY_BINDINGS as KEYB
 )
 
+# Characters that are dropped from inserted text, every one below space but
+# the line break and the tab
+CONTROL_CHARACTERS = dict.fromkeys(i for i in range(32)
+                                   if i not in (ord('\n'), ord('\t')))
+
 
 class TextEditor(Page):
     """
@@ -34,12 +51,34 @@ class TextEditor(Page):
                      KEYB['remove_word']: self.remove_word,
                      KEYB['toggle_select_mode']: self.toggle_select_mode,
                      KEYB['toggle_auto_completion']:
-                     self.toggle_auto_completion}
+                     self.toggle_auto_completion,
+                     KEYB['accept_completion']: self.accept_completion,
+                     KEYB['save']: self.save,
+                     KEYB['undo']: self.undo,
+                     KEYB['redo']: self.redo,
+                     KEYB['find']: self.toggle_search,
+                     KEYB['find_next']: self.next_match,
+                     KEYB['find_previous']: self.previous_match}
+        self.editor_keys = self.keys
+        self.search_keys = {None: self.search_keypress,
+                            KEYB['find']: self.toggle_search,
+                            KEYB['toggle_regex']: self.toggle_regex,
+                            KEYB['switch_search_field']:
+                            self.switch_search_field,
+                            KEYB['next_match']: self.next_match,
+                            KEYB['previous_match']: self.previous_match,
+                            ENTER: self.search_enter,
+                            CR: self.search_enter,
+                            LF: self.search_enter}
+        # None until a new file is saved
         self.file = file
-        self.name = pathlib.Path(file).name
+        self.name = 'Untitled' if file is None else pathlib.Path(file).name
         self.icon = 'file'
-        self.file_extension = file.split('.')[-1]
-        self.text = [list(i) for i in text.split('\n')]
+        self.file_extension = '' if file is None else file.split('.')[-1]
+        self.document = Document(text)
+        self.history = UndoHistory(self.document)
+        # The version of the document that is in the file
+        self.saved_version = self.document.version
 
         self.char_index = 0
         self.line_index = 0
@@ -62,6 +101,22 @@ class TextEditor(Page):
         self.show_auto_completion = True
         self.selected_completion = 0
 
+        self.problems = Diagnostics()
+
+        self.saver = FileSaver(self.window.reactor, self.document, file,
+                               self.save_progress, self.save_done)
+        self.save_status = ''
+
+        self.search = TextSearch(self.window.reactor, self.document,
+                                 self.search_updated)
+        self.search_field = None
+        self.search_query = ''
+        self.replace_text = ''
+        self.search_status = ''
+        self.search_is_regex = False
+        self.search_origin = 0
+        self.is_search_pending = False
+
         self.horizontal_scroll = 0
         self.line_horizontal_scroll = 0
         self.max_vertical_scroll = 0
@@ -75,34 +130,129 @@ class TextEditor(Page):
         else:
             self.formatter = TerminalFormatter(style=CONFIGS['editor.style'])
 
-        auto_completions_daemon = threading.Thread(target=self.
-                                                   set_auto_completions,
-                                                   daemon=True)
-        auto_completions_daemon.start()
+        self.highlighter = None
+        self.lint_scheduler = None
+        self.completion_service = None
+        self.words = None
+        if isinstance(text, MappedBuffer):
+            # Mapped files are too big to be lexed, linted or completed
+            if text.is_indexed is False:
+                self.window.reactor.run_in_background(text.index,
+                                                      self.index_progress)
+        else:
+            self.words = DocumentWords(self.window.words, self.document)
+            self.load_language_tools()
+
+    def load_language_tools(self):
+        """Loads the highlighter, linter and completer of the file type"""
+        try:
+            self.highlighter = Highlighter(
+                self.document, self.window.extension_commands[
+                    f'editor.lexer:{self.file_extension}'
+                ](), self.formatter
+            )
+        except KeyError:
+            self.highlighter = None
+
+        try:
+            self.lint_scheduler = LintScheduler(
+                self.window.reactor, self.language_command(
+                    f'editor.linter:{self.file_extension}'
+                ), self.document, self.set_problems
+            )
+        except KeyError:
+            self.lint_scheduler = None
+        else:
+            self.lint_scheduler.run()
+
+        try:
+            self.completion_service = CompletionService(
+                self.window.reactor, self.language_command(
+                    f'editor.auto_complete:{self.file_extension}'
+                ), self.document, self.file, self.set_auto_completions
+            )
+        except KeyError:
+            self.completion_service = None
+
+    def language_command(self, name):
+        """
+        Returns an extension command, which runs in the language service of
+        the window if it has one
+        """
+        command = self.window.extension_commands[name]
+        if self.window.language_service is None:
+            return command
+        return RemoteCommand(self.window.language_service, name)
+
+    def index_progress(self):
+        """
+        Called by the indexer of a mapped file on its worker thread, returns
+        False to stop it when the window has closed
+        """
+        reactor = self.window.reactor
+        reactor.call_soon_threadsafe(self.lines_indexed)
+        return reactor.is_closed is False
+
+    def lines_indexed(self):
+        """Shows the lines of a mapped file that have just been indexed"""
+        self.document.original_indexed()
+        self.invalidate()
 
     def __event_keypress__(self, key):
+        document = self.document
         if key[0] == BACKSPACE:
             if self.char_index > 0:
-                self.text[self.line_index].pop(self.char_index - 1)
                 self.char_index -= 1
+                document.delete(
+                    document.offset(self.line_index, self.char_index),
+                    document.offset(self.line_index, self.char_index + 1)
+                )
+                self.text_changed(self.line_index)
             elif self.line_index > 0:
-                line_lenth = len(self.text[self.line_index])
-                self.text[self.line_index - 1] += self.text[self.line_index]
-                self.text[self.line_index] = []
                 self.line_index -= 1
-                self.char_index = len(self.text[self.line_index]) - line_lenth
-                self.text.pop(self.line_index + 1)
+                self.char_index = document.line_length(self.line_index)
+                document.delete(
+                    document.offset(self.line_index, self.char_index),
+                    document.offset(self.line_index + 1, 0)
+                )
+                self.text_changed(self.line_index, removed=1)
         elif key[0] in {CR, LF, ENTER}:
-            before = self.text[self.line_index][:self.char_index]
-            after = self.text[self.line_index][self.char_index:]
-            self.text[self.line_index] = after
-            self.text[self.line_index:] = ([before] + self.text
-                                           [self.line_index:])
+            document.insert(document.offset(self.line_index,
+                                             self.char_index), '\n')
             self.line_index += 1
             self.char_index = 0
+            self.text_changed(self.line_index - 1, added=1)
         elif ord(key[0]) > 31:
-            self.text[self.line_index].insert(self.char_index, key[0])
+            document.insert(document.offset(self.line_index,
+                                             self.char_index), key[0])
             self.char_index += 1
+            self.text_changed(self.line_index)
+
+    def __event_paste__(self, text):
+        self.insert_text((self.line_index, self.char_index), text)
+
+    def text_changed(self, line, removed=0, added=0):
+        """
+        Updates what depends on the text after lines `line` to
+        `line + removed` were replaced with lines `line` to `line + added`
+        """
+        has_moved = removed != 0 or added != 0
+        self.problems.lines_changed(line, removed, added)
+        if self.words is not None:
+            self.words.lines_changed(line, removed, added)
+        if self.search.pattern is not None:
+            self.search.lines_changed(self.document.line_start(line),
+                                      self.line_end_offset(line + added))
+        if self.window.language_service is not None:
+            self.window.language_service.lines_changed(self.document, line,
+                                                       removed, added)
+        if self.highlighter is not None and self.highlighter.lines_changed(
+                line, removed, added) is True:
+            has_moved = True
+        self.invalidate_lines(line, None if has_moved is True else line)
+        if self.lint_scheduler is not None:
+            self.lint_scheduler.schedule()
+        self.request_auto_completions()
 
     def default_highlighter(self, *inputs):
         """
@@ -121,70 +271,449 @@ class TextEditor(Page):
 
     def toggle_auto_completion(self):
         """Toggles Auto Completion"""
+        old_rows = self.completion_rows()
         self.show_auto_completion = not self.show_auto_completion
+        for row in set(old_rows) | set(self.completion_rows()):
+            self.invalidate(row)
+
+    def request_auto_completions(self):
+        """
+        Asks for suggestions if the cursor is after a name or a dot, files
+        without a completer get the words of the open documents
+        """
+        if self.completion_service is None:
+            if self.words is not None:
+                self.complete_words()
+            return
+        last_char = self.document.line(self.line_index)[
+                                       self.char_index - 1:self.char_index]
+        if last_char != '' and (last_char.isalnum() or last_char in '_.'):
+            self.completion_service.request(self.line_index, self.char_index)
+        else:
+            self.close_auto_completions()
+
+    def complete_words(self):
+        """Suggests the open documents' words that start like the cursor's"""
+        text = self.document.line(self.line_index)
+        start = word_start(text, self.char_index)
+        prefix = text[start:self.char_index]
+        if prefix == '' or prefix[0].isdigit():
+            self.close_auto_completions()
+            return
+        self.set_auto_completions([
+            Completion(word, word[len(prefix):], 'word')
+            for word in self.window.words.complete(
+                prefix, CONFIGS['editor.max_completions']
+            )
+        ])
+
+    def set_auto_completions(self, suggestions):
+        """Shows suggestions below the cursor"""
+        old_rows = self.completion_rows()
+        self.auto_completion_suggestions = suggestions
+        self.selected_completion = 0
+        for row in set(old_rows) | set(self.completion_rows()):
+            self.invalidate(row)
+
+    def close_auto_completions(self):
+        """Hides the suggestions and cancels the requested ones"""
+        if self.completion_service is not None:
+            self.completion_service.cancel()
+        if self.auto_completion_suggestions:
+            self.set_auto_completions([])
+
+    def accept_completion(self):
+        """Inserts the selected suggestion"""
+        if (self.show_auto_completion is False
+                or not self.auto_completion_suggestions):
+            return
+        completion = self.auto_completion_suggestions[
+            self.selected_completion
+        ]
+        self.insert_text((self.line_index, self.char_index),
+                         completion.complete)
+        self.close_auto_completions()
+
+    def insert_text(self, position, text):
+        """
+        Inserts text, which can have many lines, at a (line, char)
+        position and moves the cursor to its end
+        """
+        line, char = position
+        text = text.replace('\r\n', '\n').replace('\r', '\n').translate(
+            CONTROL_CHARACTERS
+        )
+        if text == '':
+            return
+        self.history.seal()
+        self.document.insert(self.document.offset(line, char), text)
+        self.history.seal()
+        added = text.count('\n')
+        self.line_index = line + added
+        if added == 0:
+            self.char_index = char + len(text)
+        else:
+            self.char_index = len(text) - text.rfind('\n') - 1
+        self.text_changed(line, added=added)
+
+    def undo(self):
+        """Undoes the last edit"""
+        line_count = self.document.line_count()
+        self.history_changed(line_count, self.history.undo())
+
+    def redo(self):
+        """Redoes the last undone edit"""
+        line_count = self.document.line_count()
+        self.history_changed(line_count, self.history.redo())
+
+    def history_changed(self, line_count, change):
+        """
+        Updates the page after an edit was undone or redone and moves the
+        cursor to the end of the text it put back
+        """
+        if change is None:
+            return
+        ranges, inverse = change
+        line = self.document.position(ranges[0][0])[0]
+        self.line_index, self.char_index = self.document.position(
+            inverse[-1][1]
+        )
+        self.selected_char_index = self.char_index
+        self.selected_line_index = self.line_index
+        added = self.line_index - line
+        self.text_changed(line, removed=added + line_count
+                          - self.document.line_count(), added=added)
+        self.close_auto_completions()
 
     def paste(self):
         """Pastes a text to terminal"""
-        for i in paste():
-            if ord(i) > 31:
-                self.__event_keypress__(i)
+        self.insert_text((self.line_index, self.char_index), paste())
 
     def move_end(self):
         """Moves to end of line"""
-        self.char_index = len(self.text[self.line_index])
-        self.horizontal_scroll = len(self.text[self.line_index]) // 2
+        self.close_auto_completions()
+        self.char_index = self.document.line_length(self.line_index)
+        self.horizontal_scroll = self.char_index // 2
         self.selected_char_index = self.char_index
         self.selected_line_index = self.line_index
+        self.invalidate_lines(self.line_index, self.line_index)
 
     def move_beginning(self):
         """Moves to beginning of line"""
+        self.close_auto_completions()
         self.char_index = 0
         self.horizontal_scroll = 0
         self.selected_char_index = self.char_index
         self.selected_line_index = self.line_index
+        self.invalidate_lines(self.line_index, self.line_index)
 
     def up_keypress(self):
         """Runs at up key press"""
+        self.close_auto_completions()
         if self.line_index > 0:
             self.line_index -= 1
-            if len(self.text[self.line_index]) < self.char_index:
+            if self.document.line_length(self.line_index) < self.char_index:
                 self.move_end()
+            self.invalidate_lines(self.line_index, self.line_index + 1)
         self.selected_char_index = self.char_index
         self.selected_line_index = self.line_index
 
     def down_keypress(self):
         """Runs at down key press"""
-        if self.line_index < len(self.text) - 1:
+        self.close_auto_completions()
+        if self.line_index < self.document.line_count() - 1:
             self.line_index += 1
-            if len(self.text[self.line_index]) < self.char_index:
+            if self.document.line_length(self.line_index) < self.char_index:
                 self.move_end()
+            self.invalidate_lines(self.line_index - 1, self.line_index)
         self.selected_char_index = self.char_index
         self.selected_line_index = self.line_index
 
     def left_keypress(self):
         """Runs at left key press"""
+        self.close_auto_completions()
         if self.char_index > 0:
             self.char_index -= 1
+            self.invalidate_lines(self.line_index, self.line_index)
         self.selected_char_index = self.char_index
         self.selected_line_index = self.line_index
 
     def right_keypress(self):
         """Runs at right key press"""
-        if self.char_index <= len(self.text[self.line_index]) - 1:
+        self.close_auto_completions()
+        if self.char_index < self.document.line_length(self.line_index):
             self.char_index += 1
+            self.invalidate_lines(self.line_index, self.line_index)
+        self.selected_char_index = self.char_index
+        self.selected_line_index = self.line_index
+
+    def save(self, path=None):
+        """
+        Saves the text, to `path` from now on if it is given, a new file
+        asks where to save it first
+
+        A relative `path` is in the project, never in the directory the
+        process runs in.
+        """
+        if path is None and self.file is None:
+            path = ask_save_path()
+            if not path:
+                self.set_save_status('Not saved, no file was chosen')
+                return
+        if path is not None:
+            path = os.path.join(self.window.project_path, path)
+            self.file = path
+            self.name = pathlib.Path(path).name
+            self.saver.path = path
+            self.window.invalidate()
+        self.saved_version = self.document.version
+        self.saver.save()
+
+    def save_progress(self, fraction):
+        """Shows how much of the text has been saved"""
+        self.set_save_status(f'Saving {fraction:.0%}')
+
+    def save_done(self, error):
+        """Shows the result of a save"""
+        if error is None:
+            self.set_save_status(f'Saved {self.name}')
+        else:
+            self.saved_version = None
+            self.set_save_status(f'Could not save {self.name}: {error}')
+
+    def can_reload(self):
+        """
+        Returns True if the file can be read again without losing changes,
+        mapped files are never read again
+        """
+        return (self.document.version == self.saved_version
+                and self.document.encoding is None)
+
+    def reload(self):
+        """
+        Reads the file again after it was changed on disk, as an edit that
+        can be undone
+        """
+        with open(self.file, 'r',
+                  encoding=CONFIGS['default_encoding']) as file:
+            text = file.read()
+        line_count = self.document.line_count()
+        self.history.seal()
+        self.document.replace_ranges([(0, len(self.document), text)])
+        self.history.seal()
+        self.saved_version = self.document.version
+        self.line_index = min(self.line_index, self.document.line_count() - 1)
+        self.char_index = min(self.char_index,
+                              self.document.line_length(self.line_index))
+        self.text_changed(0, removed=line_count - 1,
+                          added=self.document.line_count() - 1)
+        self.invalidate()
+
+    def set_save_status(self, status):
+        """Changes the text shown above the first line"""
+        if status != self.save_status:
+            self.save_status = status
+            self.invalidate(1)
+
+    def cursor_offset(self):
+        """Returns the offset of the cursor"""
+        return self.document.offset(self.line_index, self.char_index)
+
+    def line_end_offset(self, line):
+        """Returns the offset after the line break of a line"""
+        if line + 1 < self.document.line_count():
+            return self.document.line_start(line + 1)
+        return len(self.document)
+
+    def find(self, query, is_regex, line, char):
+        """Finds a query and moves the cursor to its match at a position"""
+        self.line_index = min(line, self.document.line_count() - 1)
+        self.char_index = min(char, self.document.line_length(self.line_index))
+        self.search_query = query
+        self.search_is_regex = is_regex
+        self.search_origin = self.cursor_offset()
+        self.update_search()
+
+    def toggle_search(self):
+        """
+        Opens the search bar, or closes it and goes back to the text while
+        the matches stay highlighted
+        """
+        self.close_auto_completions()
+        if self.search_field is None:
+            self.search_field = 'find'
+            self.keys = self.search_keys
+            self.search_origin = self.cursor_offset()
+            if self.search.query != self.search_query:
+                self.update_search()
+        else:
+            self.search_field = None
+            self.keys = self.editor_keys
+        self.invalidate()
+
+    def search_keypress(self, key):
+        """Edits the field of the search bar"""
+        if key[0] == BACKSPACE:
+            change = slice(None, -1)
+        elif ord(key[0]) > 31:
+            change = None
+        else:
+            return
+        if self.search_field == 'find':
+            self.search_query = (self.search_query[change] if change
+                                 else self.search_query + key)
+            self.update_search()
+        else:
+            self.replace_text = (self.replace_text[change] if change
+                                 else self.replace_text + key)
+            self.invalidate(1)
+
+    def switch_search_field(self):
+        """Moves between the find and replace fields of the search bar"""
+        self.search_field = ('replace' if self.search_field == 'find'
+                             else 'find')
+        self.invalidate(1)
+
+    def toggle_regex(self):
+        """Switches between finding literal text and regexes"""
+        self.search_is_regex = not self.search_is_regex
+        self.update_search()
+
+    def update_search(self):
+        """Finds the query of the search bar from where the search started"""
+        self.search_status = ''
+        self.search.set_query(self.search_query, self.search_is_regex)
+        self.is_search_pending = True
+        self.search_updated()
+
+    def search_updated(self):
+        """
+        Shows the matches found so far and jumps to the first one after
+        where the search started once it is found
+        """
+        matches = self.search.matches
+        if self.is_search_pending is True:
+            index = matches.bisect(self.search_origin)
+            if index < len(matches):
+                self.select_match(index)
+            elif self.search.is_done is True:
+                self.is_search_pending = False
+                if len(matches) > 0:
+                    self.select_match(0)
+        self.invalidate()
+
+    def select_match(self, index):
+        """Moves the cursor to a match"""
+        self.is_search_pending = False
+        self.close_auto_completions()
+        self.line_index, self.char_index = self.document.position(
+            self.search.matches.start(index)
+        )
         self.selected_char_index = self.char_index
         self.selected_line_index = self.line_index
+        self.invalidate()
+
+    def next_match(self):
+        """Moves the cursor to the next match"""
+        index = self.search.following(self.cursor_offset())
+        if index is not None:
+            self.select_match(index)
+
+    def previous_match(self):
+        """Moves the cursor to the previous match"""
+        index = self.search.preceding(self.cursor_offset())
+        if index is not None:
+            self.select_match(index)
+
+    def search_enter(self):
+        """Finds the next match, or replaces them all in the replace field"""
+        if self.search_field == 'find':
+            self.next_match()
+        else:
+            self.replace_all()
+
+    def replace_all(self):
+        """Replaces every match with the replace text in one edit"""
+        if self.search.pattern is None:
+            return
+        line_count = self.document.line_count()
+        self.history.seal()
+        self.search_status = 'Replacing'
+        self.search.replace_all(self.replace_text, lambda count:
+                                self.replaced(line_count, count))
+        self.invalidate(1)
+
+    def replaced(self, line_count, count):
+        """Updates the page after the matches have been replaced"""
+        if count is None:
+            self.search_status = 'Could not replace'
+            self.invalidate(1)
+            return
+        # Typing right after the replace starts an undo step of its own
+        self.history.seal()
+        self.line_index = min(self.line_index, self.document.line_count() - 1)
+        self.char_index = min(self.char_index,
+                              self.document.line_length(self.line_index))
+        self.text_changed(0, removed=line_count - 1,
+                          added=self.document.line_count() - 1)
+        self.search_status = f'Replaced {count}'
+        self.invalidate()
+
+    def search_info(self):
+        """Returns which match the cursor is on and how many there are"""
+        if self.search_status != '':
+            return self.search_status
+        if self.search.error is not None:
+            return self.search.error
+        matches = self.search.matches
+        count = f'{len(matches)}' + ('' if self.search.is_done else '+')
+        offset = self.cursor_offset()
+        index = matches.bisect(offset)
+        if index < len(matches) and matches.start(index) == offset:
+            return f'{index + 1}/{count}'
+        return f'{count} matches'
+
+    def search_bar(self):
+        """Returns the text of the search bar and where its cursor is"""
+        find = ('Regex' if self.search_is_regex else 'Find') + ': '
+        find += self.search_query
+        replace = f'  Replace: {self.replace_text}'
+        cursor = len(find) if self.search_field == 'find' else len(
+            find + replace
+        )
+        return (find + replace + '  '
+                + STYLES['editor.lines.info'](self.search_info()), cursor)
+
+    def draw_matches(self, row, line, text):
+        """Highlights the matches of a line over its text"""
+        left = len(self.make_line_num(''))
+        start_limit = self.min_horizontal_scroll
+        end_limit = self.max_horizontal_scroll
+        for start, end in self.search.line_matches(text):
+            start, end = max(start, start_limit), min(end, end_limit)
+            if start >= end:
+                continue
+            self.window.move_cursor(left + start - start_limit, row)
+            self.window.write(STYLES[
+                'editor.search_current' if line == self.line_index
+                and start == self.char_index else 'editor.search_match'
+            ](text[start:end]))
 
     def to_string(self):
         """Returns string version of text"""
-        return '\n'.join([''.join(i) for i in self.text])
+        return self.document.to_string()
 
     def remove_word(self):
-        """Returns string version of text"""
-        last_word = ''.join(self.text[self.line_index]).rsplit(' ', 1)[1]
-        self.text[self.line_index] = (self.text[self.line_index]
-                                      [0: -len(last_word)])
-        self.char_index = len(self.text[self.line_index]) - len(last_word)
+        """Removes the word before the cursor"""
+        before_cursor = self.document.line(self.line_index)[:self.char_index]
+        last_word = before_cursor.rsplit(' ', 1)[-1]
+        self.document.delete(
+            self.document.offset(self.line_index,
+                                 self.char_index - len(last_word)),
+            self.document.offset(self.line_index, self.char_index)
+        )
+        self.char_index -= len(last_word)
+        self.text_changed(self.line_index)
 
     def get_icon(self):
         """Returns name of icon by file extension"""
@@ -205,22 +734,11 @@ class TextEditor(Page):
 
         return line_num
 
-    def __draw__(self):
-        self.window.move_cursor(0, 1)
-        self.window.write(self.make_line_num(''))
-
-        problems = [[] for _ in range(len(self.text) + 1)]
-
-        try:
-            linter_output = self.window.extension_commands[
-                                f'editor.linter:{self.file_extension}'
-                            ](self.to_string())
-        except KeyError:
-            linter_output = []
-
-        for i in linter_output:
-            problems[i[0] - 1].append(f'{ICONS[i[2]]} {i[1]}: {i[3]}')
-
+    def update_scroll(self):
+        """
+        Scrolls to the cursor and returns True if the scroll has changed
+        """
+        old_scroll = (self.min_vertical_scroll, self.min_horizontal_scroll)
         max_text_lenth = (self.window.terminal_cols -
                           len(self.make_line_num('')))
 
@@ -228,9 +746,6 @@ class TextEditor(Page):
         self.max_horizontal_scroll = (self.min_horizontal_scroll +
                                       max_text_lenth)
 
-        self.max_vertical_scroll = (self.min_vertical_scroll +
-                                    self.window.terminal_cols - 1)
-
         if self.line_index >= self.window.terminal_lines // 2:
             self.min_vertical_scroll = (self.line_index -
                                         self.window.terminal_lines // 2) + 1
@@ -238,43 +753,111 @@ class TextEditor(Page):
             self.min_vertical_scroll = 1
         self.max_vertical_scroll = (self.min_vertical_scroll +
                                     self.window.terminal_lines - 1)
+        return old_scroll != (self.min_vertical_scroll,
+                              self.min_horizontal_scroll)
 
-        for line_number in range(2, self.window.terminal_lines
-                                 - 1):
-            self.window.move_cursor(0, line_number)
-            self.window.write(self.make_line_num('~'))
+    def set_problems(self, linter_output):
+        """Shows the output of the linter"""
+        problems = {}
+        for i in linter_output:
+            problems.setdefault(i[0] - 1, f'{ICONS[i[2]]} {i[1]}: {i[3]}')
+        for line in self.problems.replace(problems):
+            self.invalidate_lines(line, line)
 
-        for line, chars in list(enumerate(self.text))[self.min_vertical_scroll
-                                                      - 1:
-                                                      self.max_vertical_scroll
-                                                      - 4]:
-            if problems[line] != []:
-                problems_str = ' ' + problems[line][0]
-            else:
-                problems_str = ''
-            self.window.move_cursor(0, 3 + line - self.min_vertical_scroll)
-            text = self.syntax_highlighter(''.join(chars)[
-                                  self.min_horizontal_scroll:
-                                  self.max_horizontal_scroll
-                              ], self.formatter)
-            self.window.write(self.make_line_num(line))
-            self.window.write(text)
-            self.window.write(problems_str)
+    def line_row(self, line):
+        """Returns the terminal line that a line of the text is drawn on"""
+        return 3 + line - self.min_vertical_scroll
 
-    def set_auto_completions(self):
+    def invalidate_lines(self, first, last=None):
         """
-        Gets auto completion suggestions from extension and then sets
-        `self.auto_completion_suggestions` to output of that
+        Marks lines `first` to `last` of the text, or every line after
+        `first`, as changed
         """
-        try:
-            plugin_output = self.window.extension_commands[
-                f'editor.auto_complete:{self.file_extension}'
-            ](self.to_string(), self.char_index + 1, self.line_index + 1)
-        except KeyError:
-            plugin_output = []
-        self.auto_completion_suggestions = plugin_output
+        bottom = self.window.terminal_lines - 1
+        if self.update_scroll() is True:
+            self.invalidate()
+        else:
+            self.invalidate(max(2, self.line_row(first)),
+                            bottom if last is None
+                            else min(bottom, self.line_row(last) + 1))
+
+    def __draw__(self):
+        self.update_scroll()
+
+        for row in range(1, self.window.terminal_lines - 1):
+            self.draw_row(row)
+
+    def __draw_lines__(self, lines):
+        self.update_scroll()
+        for row in sorted(lines):
+            self.draw_row(row)
+
+    def draw_row(self, row):
+        """Draws a terminal line of the page"""
+        line = row - 3 + self.min_vertical_scroll
+        self.window.move_cursor(0, row)
+        if row == 1:
+            self.window.write(self.make_line_num(''))
+            if self.search_field is not None:
+                self.window.write(self.search_bar()[0])
+            else:
+                self.window.write(STYLES['editor.lines.info'](
+                    self.save_status
+                ))
+        elif (row > self.window.terminal_lines - 3
+                or line >= self.document.line_count()):
+            self.window.write(self.make_line_num('~'))
+        else:
+            if self.highlighter is not None:
+                start = time.perf_counter()
+                text = self.highlighter.highlight(line,
+                                                  self.min_horizontal_scroll,
+                                                  self.max_horizontal_scroll)
+                self.window.metrics.record(
+                    f'editor.highlight:{self.file_extension}', start
+                )
+            else:
+                text = self.syntax_highlighter(self.document.line(line)[
+                                                   self.min_horizontal_scroll:
+                                                   self.max_horizontal_scroll
+                                               ], self.formatter)
+            self.window.write(self.make_line_num(line + 1))
+            self.window.write(text)
+            problem = self.problems.get(line)
+            if problem is not None:
+                self.window.write(' ' + problem)
+            if self.search.line_pattern is not None:
+                self.draw_matches(row, line, self.document.line(line))
+
+        if row in self.completion_rows():
+            self.draw_completion(row)
+
+    def completion_rows(self):
+        """Returns the terminal lines that suggestions are drawn on"""
+        if self.show_auto_completion is False:
+            return range(0)
+        top = self.line_row(self.line_index) + 1
+        return range(top, min(top + len(self.auto_completion_suggestions[
+                                  :CONFIGS['editor.max_completions']
+                              ]), self.window.terminal_lines - 1))
+
+    def draw_completion(self, row):
+        """Draws a suggestion"""
+        index = row - self.completion_rows().start
+        completion = self.auto_completion_suggestions[index]
+        self.window.move_cursor(len(self.make_line_num('')) + self.char_index
+                                - self.min_horizontal_scroll, row)
+        self.window.write(STYLES['completionbox.selected'
+                                 if index == self.selected_completion else
+                                 'completionbox.color'](
+            f' {ICONS.get(completion.type, "")}{completion.name} '
+        ))
 
     def __cursor__(self):
+        if self.search_field is not None:
+            return {'is_hidden': False, 'position': [
+                len(self.make_line_num('')) + self.search_bar()[1], 0
+            ]}
         if self.line_index >= self.window.terminal_lines // 2:
             line = self.window.terminal_lines // 2
         else:
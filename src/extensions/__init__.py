@@ -4,9 +4,12 @@ from . import (
     python_auto_complete,
     home_page,
     explorer_page,
+    finder_page,
+    grep_page,
     python_linter,
 )
 
 extensions = [python_auto_complete.Extension(), default_syntaxes.Extension(),
               home_page.Extension(), python_linter.Extension(),
-              explorer_page.Extension()]
+              explorer_page.Extension(), finder_page.Extension(),
+              grep_page.Extension()]
@@ -17,4 +17,5 @@ RUNTIME_ERROR = 'Runtime Error', ERROR
 SYNTAX_ERROR = 'Syntax Error', ERROR
 SYSTEM_ERROR = 'System Error', ERROR
 TYPE_ERROR = 'Type Error', WARNING
+UNUSED_IMPORT_ERROR = 'Unused Import', WARNING
 VALUE_ERROR = 'Value Error', ERROR
@@ -8,16 +8,20 @@ class Extension():
     """Extension"""
     def __init__(self):
         self.commands = {'editor.highlight:py': self.highlighter_python,
-                         'editor.highlight:md': self.highlighter_markdown}
+                         'editor.highlight:md': self.highlighter_markdown,
+                         'editor.lexer:py': Python3Lexer,
+                         'editor.lexer:md': MarkdownLexer}
+        self.python_lexer = Python3Lexer()
+        self.markdown_lexer = MarkdownLexer()
 
     def highlighter_python(self, code, formatter):
         """Syntax Highlighter"""
         return highlight(code,
-                         lexer=Python3Lexer(),
+                         lexer=self.python_lexer,
                          formatter=formatter)[:-1]
 
     def highlighter_markdown(self, code, formatter):
         """Syntax Highlighter"""
         return highlight(code,
-                         lexer=MarkdownLexer(),
+                         lexer=self.markdown_lexer,
                          formatter=formatter)[:-1]
@@ -2,64 +2,202 @@
 Explorer page
 """
 import os
+from bisect import bisect_left
 
 from ..page import Page
-from ..edit import TextEditor
 from ..consts import (
-    UP, DOWN, ENTER, CR, LF
+    UP, DOWN, ENTER, CR, LF, BACKSPACE, CTRL_F
 )
-from ..settings import STYLES, CONFIGS
+from ..settings import STYLES
+
+# Entries are (is_file, folded name, name) tuples, so they sort with the
+# directories first
+PARENT = (False, '..', '..')
+LISTING_BATCH = 4096
+LISTING_CACHE_SIZE = 64
 
 
 class Explorer(Page):
     """
     Explorer Page
+
+    Directories are scanned on a worker thread and their entries are shown
+    as they arrive, then sorted once the scan has finished. Finished
+    listings are kept with the modification time of their directory and
+    used again until it changes. Typed text filters the entries and
+    Ctrl+F searches the files of the directory.
     """
+    listings = {}
+
     def __init__(self, window):
         self.keys = {None: self.__event_keypress__, UP: self.up_key_press,
                      DOWN: self.down_key_press, ENTER: self.select,
-                     CR: self.select, LF: self.select}
+                     CR: self.select, LF: self.select,
+                     CTRL_F: self.search_files}
         self.name = 'Explorer'
         self.icon = 'home'
         self.window = window
 
-        self.path = os.getcwd()
-        self.files = ['..'] + os.listdir(self.path)
+        self.path = None
+        self.entries = []
+        self.files = [PARENT]
+        self.filter = ''
+        self.status = ''
+        self.is_loading = False
+        self.generation = 0
         self.selected_file = 0
         self.vertical_scroll = 0
         self.min_vertical_scroll = 0
+        self.list_directory(os.getcwd())
 
-    def __event_keypress__(self, _):
-        pass
+    def __event_keypress__(self, key):
+        if key == BACKSPACE:
+            if self.filter != '':
+                self.set_filter(self.filter[:-1])
+        elif key.isprintable():
+            self.set_filter(self.filter + key)
+
+    def list_directory(self, path):
+        """Shows the entries of a directory"""
+        self.path = path
+        self.generation += 1
+        self.filter = ''
+        self.status = ''
+        self.selected_file = 0
+        self.vertical_scroll = 0
+        self.min_vertical_scroll = 0
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        listing = self.listings.get(path)
+        if listing is not None and listing[0] == mtime:
+            self.entries = listing[1]
+            self.files = [PARENT, *self.entries]
+            self.is_loading = False
+        else:
+            self.entries = []
+            self.files = [PARENT]
+            self.is_loading = True
+            self.window.reactor.run_in_background(self.scan, path, mtime,
+                                                  self.generation)
+        self.invalidate()
+
+    def scan(self, path, mtime, generation):
+        """
+        Reads the entries of a directory in batches, called on a worker
+        thread
+        """
+        reactor = self.window.reactor
+        entries = []
+        batch = []
+        try:
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        is_file = not entry.is_dir()
+                    except OSError:
+                        is_file = True
+                    batch.append((is_file, entry.name.lower(), entry.name))
+                    if len(batch) == LISTING_BATCH:
+                        if generation != self.generation:
+                            return
+                        entries += batch
+                        reactor.call_soon_threadsafe(self.entries_found,
+                                                     generation, batch)
+                        batch = []
+        except OSError:
+            mtime = None
+        entries += batch
+        reactor.call_soon_threadsafe(self.entries_found, generation, batch)
+        entries.sort()
+        reactor.call_soon_threadsafe(self.listed, generation, path, mtime,
+                                     entries)
+
+    def entries_found(self, generation, batch):
+        """Shows entries that a scan has found"""
+        if generation != self.generation:
+            return
+        self.entries.extend(batch)
+        old_length = len(self.files)
+        self.files.extend(self.matching(batch))
+        self.invalidate_visible(range(old_length, len(self.files)))
+
+    def listed(self, generation, path, mtime, entries):
+        """Keeps the sorted entries of a finished scan and shows them"""
+        if mtime is not None:
+            self.listings.pop(path, None)
+            self.listings[path] = (mtime, entries)
+            if len(self.listings) > LISTING_CACHE_SIZE:
+                del self.listings[next(iter(self.listings))]
+        if generation != self.generation:
+            return
+        selected = self.files[self.selected_file]
+        self.entries = entries
+        self.files = [PARENT, *self.matching(entries)]
+        if selected is not PARENT:
+            self.selected_file = min(bisect_left(self.files, selected, 1),
+                                     len(self.files) - 1)
+        self.is_loading = False
+        self.invalidate()
+
+    def matching(self, entries):
+        """Returns the entries whose names have the filter in them"""
+        if self.filter == '':
+            return list(entries)
+        folded = self.filter.lower()
+        return [i for i in entries if folded in i[1]]
+
+    def set_filter(self, text):
+        """Shows only the entries whose names have `text` in them"""
+        if self.filter != '' and self.filter.lower() in text.lower():
+            # A longer filter only matches entries that are already shown
+            entries = self.files[1:]
+        else:
+            entries = self.entries
+        self.filter = text
+        self.status = ''
+        self.files = [PARENT, *self.matching(entries)]
+        self.selected_file = 0 if text == '' else min(1, len(self.files) - 1)
+        self.min_vertical_scroll = 0
+        self.invalidate()
 
     def down_key_press(self):
         """Runs at down key press"""
         if self.selected_file < len(self.files) - 1:
             self.selected_file += 1
+            self.invalidate_files(self.selected_file - 1, self.selected_file)
 
     def up_key_press(self):
         """Runs at up key press"""
         if self.selected_file > 0:
             self.selected_file -= 1
+            self.invalidate_files(self.selected_file, self.selected_file + 1)
 
     def select(self):
         """Runs at enter key press"""
-        file_path = os.path.join(self.path, self.files[self.selected_file])
-        if os.path.isfile(file_path):
-            with (open(file_path, 'r', encoding=CONFIGS['default_encoding']) as
-                  file):
-                self.window.tabs.append(TextEditor(
-                    self.window, file_path, file.read()
-                ))
-            self.window.current_tab = len(self.window.tabs) - 1
+        is_file, _, name = self.files[self.selected_file]
+        file_path = os.path.join(self.path, name)
+        if is_file is True:
+            try:
+                self.window.open_path(file_path)
+            except (OSError, ValueError) as error:
+                self.status = f'Could not open {name}: {error}'
         else:
-            self.path = file_path
-            self.files = ['..'] + os.listdir(self.path)
-            self.selected_file = 0
-            self.vertical_scroll = 0
+            self.list_directory(os.path.normpath(file_path))
         self.min_vertical_scroll = 0
+        self.invalidate()
 
-    def __draw__(self):
+    def search_files(self):
+        """Searches the files of the directory"""
+        self.window.search_files(self.path)
+
+    def update_scroll(self):
+        """
+        Scrolls to the selected file and returns True if the scroll has
+        changed
+        """
+        old_scroll = self.min_vertical_scroll
         if self.selected_file >= self.window.terminal_lines // 2:
             self.min_vertical_scroll = (self.selected_file -
                                         self.window.terminal_lines // 2) + 1
@@ -67,15 +205,53 @@ class Explorer(Page):
             self.min_vertical_scroll = 1
         self.vertical_scroll = (self.min_vertical_scroll +
                                 self.window.terminal_lines - 1)
+        return old_scroll != self.min_vertical_scroll
+
+    def invalidate_files(self, *files):
+        """Marks the lines of some files as changed"""
+        if self.update_scroll() is True:
+            self.invalidate()
+        else:
+            for file in files:
+                self.invalidate(file - self.min_vertical_scroll + 3)
 
-        for line, text in list(enumerate(self.files))[self.min_vertical_scroll
-                                                      - 1: self.
-                                                      vertical_scroll - 4]:
-            self.window.move_cursor(1, line - self.min_vertical_scroll + 3)
-            if line == self.selected_file:
-                self.window.write(STYLES['explorer_page.selected'](text))
-            else:
-                self.window.write(text)
+    def invalidate_visible(self, files):
+        """Marks the lines of the files that are on the screen as changed"""
+        visible = range(self.min_vertical_scroll - 1,
+                        self.vertical_scroll - 4)
+        self.invalidate_files(*range(max(files.start, visible.start),
+                                     min(files.stop, visible.stop)))
+        if 0 in visible and self.is_loading is True:
+            self.invalidate_files(0)
+
+    def __draw__(self):
+        self.update_scroll()
+
+        for line in range(self.min_vertical_scroll - 1,
+                          min(len(self.files), self.vertical_scroll - 4)):
+            self.draw_file(line, self.files[line])
+
+    def __draw_lines__(self, lines):
+        for line in lines:
+            file = line + self.min_vertical_scroll - 3
+            if 0 <= file < len(self.files):
+                self.draw_file(file, self.files[file])
+
+    def draw_file(self, line, entry):
+        """Draws name of a file"""
+        text = entry[2] if entry[0] is True else entry[2] + os.sep
+        if entry is PARENT:
+            if self.filter != '':
+                text += f'  {self.filter}'
+            if self.is_loading is True:
+                text += f'  ({len(self.entries)} entries)'
+            if self.status != '':
+                text += f'  {self.status}'
+        self.window.move_cursor(1, line - self.min_vertical_scroll + 3)
+        if line == self.selected_file:
+            self.window.write(STYLES['explorer_page.selected'](text))
+        else:
+            self.window.write(text)
 
     def __cursor__(self):
         return {'is_hidden': True, 'position': [0, 0]}
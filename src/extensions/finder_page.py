@@ -0,0 +1,156 @@
+"""
+Finder page
+"""
+import os
+
+from ..page import Page
+from ..paths import PathIndex, PathSearch
+from ..consts import (
+    UP, DOWN, ENTER, CR, LF, BACKSPACE
+)
+from ..settings import STYLES, CONFIGS
+
+
+class Finder(Page):
+    """
+    Finder Page
+
+    Finds the files of a project by typing characters of their paths. The
+    paths come from a `PathIndex` and are searched between frames, so the
+    best matches found so far are shown while the search goes on.
+    """
+    def __init__(self, window, path):
+        self.keys = {None: self.__event_keypress__, UP: self.up_key_press,
+                     DOWN: self.down_key_press, ENTER: self.select,
+                     CR: self.select, LF: self.select}
+        self.name = 'Finder'
+        self.icon = 'folder'
+        self.window = window
+
+        self.path = path
+        self.query = ''
+        self.results = []
+        self.selected_result = 0
+        self.status = ''
+        self.search = None
+        self.searched_text = None
+        self.timer = None
+        self.index = PathIndex(window.reactor, path, self.paths_changed)
+
+    def __event_keypress__(self, key):
+        if key == BACKSPACE:
+            if self.query != '':
+                self.query = self.query[:-1]
+                self.start_search()
+        elif key.isprintable():
+            self.query += key
+            self.start_search()
+
+    def paths_changed(self):
+        """Searches the paths again after they have changed"""
+        self.start_search()
+
+    def start_search(self):
+        """
+        Searches for the query, only in the matches of the last search if
+        the query has just been typed on
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+        self.status = ''
+        if (self.search is not None and self.search.is_done is True
+                and self.searched_text is self.index.text
+                and self.query.startswith(self.search.query)):
+            self.search = self.search.narrow(self.query)
+        else:
+            self.search = PathSearch(self.index.text, self.query,
+                                     self.result_rows())
+            self.searched_text = self.index.text
+        self.selected_result = 0
+        self.continue_search()
+
+    def continue_search(self):
+        """Searches for a frame's time and shows the best matches so far"""
+        self.timer = None
+        if self.search.step(CONFIGS['finder.search_budget']) is False:
+            self.timer = self.window.reactor.call_later(0,
+                                                        self.continue_search)
+        self.results = self.search.results()
+        self.selected_result = min(self.selected_result,
+                                   max(0, len(self.results) - 1))
+        self.invalidate()
+
+    def result_rows(self):
+        """Returns how many results fit on the page"""
+        return max(1, self.window.terminal_lines - 4)
+
+    def down_key_press(self):
+        """Runs at down key press"""
+        if self.selected_result < len(self.results) - 1:
+            self.selected_result += 1
+            self.invalidate(self.selected_result + 2, self.selected_result + 4)
+
+    def up_key_press(self):
+        """Runs at up key press"""
+        if self.selected_result > 0:
+            self.selected_result -= 1
+            self.invalidate(self.selected_result + 3, self.selected_result + 5)
+
+    def select(self):
+        """Runs at enter key press"""
+        if self.results:
+            path = self.results[self.selected_result]
+            try:
+                self.window.open_path(os.path.join(self.path, path))
+            except (OSError, ValueError) as error:
+                self.status = f'Could not open {path}: {error}'
+            self.invalidate()
+
+    def __draw__(self):
+        self.draw_query()
+        for result in range(min(len(self.results), self.result_rows())):
+            self.draw_result(result)
+
+    def __draw_lines__(self, lines):
+        for line in lines:
+            if line == 2:
+                self.draw_query()
+            elif 0 <= line - 3 < min(len(self.results), self.result_rows()):
+                self.draw_result(line - 3)
+
+    def draw_query(self):
+        """Draws the query and how many paths are searched"""
+        if self.status != '':
+            info = self.status
+        elif self.index.is_crawled is False:
+            info = f'indexing {self.index.count} files'
+        elif self.search is not None and self.search.is_done is False:
+            info = f'searching {self.index.count} files'
+        else:
+            info = f'{self.index.count} files'
+        self.window.move_cursor(1, 2)
+        self.window.write(f'> {self.query}  '
+                          + STYLES['finder_page.info'](info))
+
+    def draw_result(self, result):
+        """Draws a path that matches the query"""
+        self.window.move_cursor(1, result + 3)
+        if result == self.selected_result:
+            self.window.write(STYLES['finder_page.selected'](
+                self.results[result]
+            ))
+        else:
+            self.window.write(self.results[result])
+
+    def __cursor__(self):
+        return {'is_hidden': False, 'position': [3 + len(self.query), 1]}
+
+
+class Extension():
+    """Extension"""
+    def __init__(self):
+        self.commands = {'finder_page.page': self.finder_page()}
+
+    def finder_page(self):
+        """Returns the finder page"""
+        return Finder
@@ -0,0 +1,370 @@
+"""
+Grep page
+"""
+import os
+import re
+
+from ..page import Page
+from ..grep import ProjectSearch
+from ..search import compile_query
+from ..consts import (
+    UP, DOWN, ENTER, CR, LF, BACKSPACE, TAB, CTRL_R, SUPR
+)
+from ..settings import STYLES, CONFIGS
+
+
+class Grep(Page):
+    """
+    Grep Page
+
+    Finds a query in the files of a directory with a `ProjectSearch` and
+    shows the matching lines as they are found, grouped by file. Enter opens
+    the selected match in an editor. In the replace field the first Enter
+    shows every match with its replacement and the second one replaces them
+    in the files, Delete leaves the selected file out.
+    """
+    def __init__(self, window, path):
+        self.keys = {None: self.__event_keypress__, UP: self.up_key_press,
+                     DOWN: self.down_key_press, ENTER: self.enter,
+                     CR: self.enter, LF: self.enter, TAB: self.switch_field,
+                     CTRL_R: self.toggle_regex, SUPR: self.remove_file}
+        self.name = 'Search'
+        self.icon = 'folder'
+        self.window = window
+
+        self.path = path
+        self.field = 'find'
+        self.query = ''
+        self.replace_text = ''
+        self.is_regex = False
+        self.pattern = None
+        self.files = []
+        self.rows = []
+        self.hit_count = 0
+        self.selected_row = 0
+        self.min_row = 0
+        self.status = ''
+        self.is_reviewing = False
+        self.search = ProjectSearch(window.reactor, window.search_pool(), path,
+                                    self.found)
+
+    def __event_keypress__(self, key):
+        if key == BACKSPACE:
+            change = slice(None, -1)
+        elif key.isprintable():
+            change = None
+        else:
+            return
+        if self.field == 'find':
+            self.query = self.query[change] if change else self.query + key
+        else:
+            self.replace_text = (self.replace_text[change] if change
+                                 else self.replace_text + key)
+        self.status = ''
+        self.set_reviewing(False)
+        self.invalidate(2)
+
+    def switch_field(self):
+        """Moves between the find and replace fields"""
+        self.field = 'replace' if self.field == 'find' else 'find'
+        self.set_reviewing(False)
+        self.invalidate(2)
+
+    def toggle_regex(self):
+        """Switches between finding literal text and regexes"""
+        self.is_regex = not self.is_regex
+        self.status = ''
+        self.set_reviewing(False)
+        self.invalidate(2)
+
+    def set_reviewing(self, is_reviewing):
+        """Shows or hides the replacements of the matches"""
+        if self.is_reviewing != is_reviewing:
+            self.is_reviewing = is_reviewing
+            self.invalidate()
+
+    def start_search(self):
+        """Finds the query in the files of the directory"""
+        self.files = []
+        self.rows = []
+        self.hit_count = 0
+        self.selected_row = 0
+        self.min_row = 0
+        self.pattern = None
+        if self.query == '':
+            self.search.cancel()
+        else:
+            try:
+                self.pattern = compile_query(self.query, self.is_regex)
+            except re.error as error:
+                self.search.cancel()
+                self.status = str(error)
+            else:
+                self.search.start(self.query, self.is_regex)
+        self.invalidate()
+
+    def found(self, files):
+        """Shows files that the search has found"""
+        first_row = len(self.rows)
+        for path, mtime, hits in files:
+            self.rows.append((len(self.files), None))
+            self.rows += [(len(self.files), hit) for hit in range(len(hits))]
+            self.files.append((path, mtime, hits))
+            self.hit_count += len(hits)
+        self.invalidate(2)
+        if first_row < self.min_row + self.result_rows():
+            self.invalidate(3 + first_row - self.min_row,
+                            3 + self.result_rows())
+
+    def result_rows(self):
+        """Returns how many rows of results fit on the page"""
+        return max(1, self.window.terminal_lines - 4)
+
+    def select_row(self, row):
+        """Selects a row of the results and scrolls to it"""
+        old_row = self.selected_row
+        self.selected_row = row
+        if row < self.min_row:
+            self.min_row = row
+            self.invalidate()
+        elif row >= self.min_row + self.result_rows():
+            self.min_row = row - self.result_rows() + 1
+            self.invalidate()
+        else:
+            self.invalidate(3 + old_row - self.min_row)
+            self.invalidate(3 + row - self.min_row)
+
+    def down_key_press(self):
+        """Runs at down key press"""
+        if self.selected_row < len(self.rows) - 1:
+            self.select_row(self.selected_row + 1)
+
+    def up_key_press(self):
+        """Runs at up key press"""
+        if self.selected_row > 0:
+            self.select_row(self.selected_row - 1)
+
+    def enter(self):
+        """
+        Searches for a changed query or opens the selected match, in the
+        replace field shows and then makes the replacements
+        """
+        if self.field == 'find':
+            if (self.query, self.is_regex) != (self.search.query,
+                                               self.search.is_regex):
+                self.start_search()
+            else:
+                self.open_selected()
+        elif self.search.is_done is False:
+            self.status = 'Searching'
+            self.invalidate(2)
+        elif self.is_reviewing is False:
+            if self.files:
+                self.status = self.review_status()
+                self.set_reviewing(True)
+            self.invalidate(2)
+        else:
+            self.set_reviewing(False)
+            self.status = 'Replacing'
+            editors = self.open_editors()
+            files = []
+            left_out = []
+            for path, mtime, hits in self.files:
+                editor = editors.get(path)
+                if editor is not None and editor.can_reload() is False:
+                    left_out.append(path)
+                else:
+                    files.append((path, mtime, len(hits)))
+            self.search.replace(
+                files, self.replace_text,
+                lambda count, failed, unreviewed: self.replaced(
+                    count, failed, unreviewed, left_out
+                )
+            )
+            self.invalidate(2)
+
+    def open_editors(self):
+        """Returns the editor tabs of the files of the results by path"""
+        paths = {os.path.realpath(os.path.join(self.path, path)): path
+                 for path, _, _ in self.files}
+        return {paths[os.path.realpath(tab.file)]: tab
+                for tab in self.window.tabs
+                if hasattr(tab, 'reload') and tab.file is not None
+                and os.path.realpath(tab.file) in paths}
+
+    def replaced(self, count, failed, unreviewed, left_out):
+        """
+        Shows how many matches were replaced, reads the files that are open
+        in editors again and searches again
+        """
+        skipped = set(failed) | set(unreviewed) | set(left_out)
+        edited = []
+        for path, editor in self.open_editors().items():
+            if path in skipped:
+                continue
+            if editor.can_reload() is False:
+                # Edited while the files were replaced, its text is kept
+                edited.append(path)
+                continue
+            try:
+                editor.reload()
+            except (OSError, ValueError):
+                failed.append(path)
+        self.start_search()
+        self.status = f'Replaced {count} matches'
+        if failed:
+            self.status += (f', {len(failed)} files had changed or could not'
+                            ' be written')
+        if unreviewed:
+            self.status += (f', {len(unreviewed)} files had more matches '
+                            'than were shown and were left out')
+        if left_out:
+            self.status += (f', {len(left_out)} files open with unsaved '
+                            'changes or too big to reload were left out')
+        if edited:
+            self.status += (f', {len(edited)} files were edited while '
+                            'replacing and not reloaded')
+
+    def open_selected(self):
+        """Opens the file of the selected match at the match"""
+        if not self.rows:
+            return
+        file, hit = self.rows[self.selected_row]
+        path, _, hits = self.files[file]
+        line, column, _, _ = hits[hit or 0]
+        try:
+            self.window.open_path(os.path.join(self.path, path))
+        except (OSError, ValueError) as error:
+            self.status = f'Could not open {path}: {error}'
+            self.invalidate(2)
+            return
+        self.window.tabs[self.window.current_tab].find(
+            self.search.query, self.search.is_regex, line, column
+        )
+
+    def remove_file(self):
+        """Leaves the file of the selected row out of the replacements"""
+        if not self.rows:
+            return
+        file = self.rows[self.selected_row][0]
+        self.hit_count -= len(self.files[file][2])
+        del self.files[file]
+        self.rows = [(index, hit) for index, (_, _, hits)
+                     in enumerate(self.files)
+                     for hit in (None, *range(len(hits)))]
+        while self.selected_row > 0 and (
+                self.selected_row >= len(self.rows)
+                or self.rows[self.selected_row][1] is not None):
+            self.selected_row -= 1
+        self.min_row = min(self.min_row, self.selected_row)
+        if self.is_reviewing is True:
+            self.status = self.review_status()
+        self.invalidate()
+
+    def review_status(self):
+        """
+        Returns what the next Enter replaces, files with more matches than
+        are shown are left out of it
+        """
+        status = (f'Enter replaces {self.hit_count} matches in '
+                  f'{len(self.files)} files')
+        limit = CONFIGS['grep.max_file_hits']
+        capped = sum(1 for _, _, hits in self.files if len(hits) >= limit)
+        if capped > 0:
+            status += (f', {capped} files show only their first {limit} '
+                       'matches and are left out if they have more')
+        return status
+
+    def info(self):
+        """Returns how far the search is and what it has found"""
+        if self.status != '':
+            return self.status
+        info = f'{self.hit_count} matches in {len(self.files)} files'
+        if self.search.is_done is False:
+            info = (f'searching {self.search.searched_count}/'
+                    f'{self.search.file_count} files, {info}')
+        if self.search.skipped_count > 0:
+            info += f', {self.search.skipped_count} binary files skipped'
+        return info
+
+    def bar(self):
+        """Returns the text of the fields and where the cursor is"""
+        find = ('Regex' if self.is_regex else 'Find') + f': {self.query}'
+        replace = f'  Replace: {self.replace_text}'
+        return find + replace, len(find if self.field == 'find'
+                                   else find + replace)
+
+    def replacement(self, text, column):
+        """Returns what replaces the match at a column of a line"""
+        if self.search.is_regex is False:
+            return self.replace_text
+        match = self.pattern.match(text, column)
+        try:
+            return match.expand(self.replace_text)
+        except (AttributeError, IndexError, re.error):
+            return self.replace_text
+
+    def __draw__(self):
+        self.draw_bar()
+        for row in range(self.min_row, min(len(self.rows),
+                                           self.min_row + self.result_rows())):
+            self.draw_row(row)
+
+    def __draw_lines__(self, lines):
+        for line in lines:
+            row = line - 3 + self.min_row
+            if line == 2:
+                self.draw_bar()
+            elif (line >= 3 and row < len(self.rows)
+                    and row < self.min_row + self.result_rows()):
+                self.draw_row(row)
+
+    def draw_bar(self):
+        """Draws the fields and the state of the search"""
+        self.window.move_cursor(1, 2)
+        self.window.write(self.bar()[0] + '  '
+                          + STYLES['grep_page.info'](self.info()))
+
+    def draw_row(self, row):
+        """Draws a file or a matching line"""
+        file, hit = self.rows[row]
+        path, _, hits = self.files[file]
+        self.window.move_cursor(1, 3 + row - self.min_row)
+        is_selected = row == self.selected_row
+        if hit is None:
+            text = f'{path} ({len(hits)})'
+            self.window.write(STYLES['grep_page.selected' if is_selected
+                                     else 'grep_page.file'](text))
+            return
+        line, column, length, text = hits[hit]
+        number = f'{line + 1:>6}: '
+        width = max(1, self.window.terminal_cols - len(number) - 2)
+        text = text.replace('\t', ' ')
+        start = 0 if column + length <= width else column - width // 2
+        text, column = text[start:], column - start
+        match = text[column:column + length]
+        if self.is_reviewing is True:
+            match = (STYLES['grep_page.removed'](match)
+                     + STYLES['grep_page.added'](
+                         self.replacement(hits[hit][3], hits[hit][1])
+                     ))
+        else:
+            match = STYLES['grep_page.match'](match)
+        self.window.write(
+            (STYLES['grep_page.selected'](number) if is_selected else number)
+            + text[:column] + match
+            + text[column + length:max(column + length, width)]
+        )
+
+    def __cursor__(self):
+        return {'is_hidden': False, 'position': [1 + self.bar()[1], 1]}
+
+
+class Extension():
+    """Extension"""
+    def __init__(self):
+        self.commands = {'grep_page.page': self.grep_page()}
+
+    def grep_page(self):
+        """Returns the grep page"""
+        return Grep
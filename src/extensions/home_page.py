@@ -22,11 +22,14 @@ class Home(Page):
 
         self.options = ['New File       Ctrl + n',
                         'Open File      Ctrl + o',
-                        'Open Project   Ctrl + o']
+                        'Open Project   Ctrl + p']
         self.options_executable = [self.new_file, self.open_file,
-                                   self.open_file]
+                                   self.open_project]
         self.selected_option = 0
 
+        with open('_home_page/logo.txt', 'r', encoding='utf8') as file:
+            self.logo = file.read().split('\n')
+
     def __event_keypress__(self, _):
         pass
 
@@ -34,35 +37,48 @@ class Home(Page):
         """Runs at down key press"""
         if self.selected_option < len(self.options) - 1:
             self.selected_option += 1
+            self.invalidate(12 + self.selected_option)
+            self.invalidate(13 + self.selected_option)
 
     def up_key_press(self):
         """Runs at up key press"""
         if self.selected_option > 0:
             self.selected_option -= 1
+            self.invalidate(13 + self.selected_option)
+            self.invalidate(14 + self.selected_option)
 
     def select(self):
         """Runs at enter key press"""
         self.options_executable[self.selected_option]()
 
     def __draw__(self):
-        with open('_home_page/logo.txt', 'r', encoding='utf8') as file:
-            file_text = file.read()
-            first_line = file_text.split('\n')[1]
-            text_lenth = (first_line.count('▄') + first_line.count('▀')
-                          + first_line.count(' '))
-            for line, text in enumerate(file_text.split('\n')):
-                self.window.move_cursor(round((self.window.terminal_cols
-                                               - text_lenth) / 2), 3 + line)
-                self.window.write(text)
-            max_lenth = len(max(self.options, key=len))
-            for line, text in enumerate(self.options):
-                self.window.move_cursor(round((self.window.terminal_cols
-                                               - max_lenth
-                                               - 1) / 2), 13 + line)
-                if line == self.selected_option:
-                    self.window.write(STYLES['home_page.selected'](text))
-                else:
-                    self.window.write(text)
+        first_line = self.logo[1]
+        text_lenth = (first_line.count('▄') + first_line.count('▀')
+                      + first_line.count(' '))
+        for line, text in enumerate(self.logo):
+            self.window.move_cursor(round((self.window.terminal_cols
+                                           - text_lenth) / 2), 3 + line)
+            self.window.write(text)
+        for line in range(len(self.options)):
+            self.draw_option(line)
+
+    def __draw_lines__(self, lines):
+        for line in lines:
+            if 0 <= line - 13 < len(self.options):
+                self.draw_option(line - 13)
+
+    def draw_option(self, option):
+        """Draws an option"""
+        max_lenth = len(max(self.options, key=len))
+        self.window.move_cursor(round((self.window.terminal_cols
+                                       - max_lenth
+                                       - 1) / 2), 13 + option)
+        if option == self.selected_option:
+            self.window.write(STYLES['home_page.selected'](
+                self.options[option]
+            ))
+        else:
+            self.window.write(self.options[option])
 
     def new_file(self):
         """Opens a new file"""
@@ -72,6 +88,10 @@ class Home(Page):
         """Opens a file"""
         self.window.open_file()
 
+    def open_project(self):
+        """Opens the finder of the project"""
+        self.window.open_project()
+
     def __cursor__(self):
         return {'is_hidden': True, 'position': [0, 0]}
 
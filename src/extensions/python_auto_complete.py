@@ -1,4 +1,6 @@
 """Auto complete for python language"""
+import os
+
 import jedi
 
 
@@ -7,13 +9,31 @@ class Extension():
     def __init__(self):
         self.commands = {'editor.auto_complete:py': self.auto_complete}
         self.auto_complete_file_extensions = ['.py']
+        self.projects = {}
+        self.scripts = {}
+
+    def get_script(self, code, path):
+        """
+        Returns a jedi script of the code, the project of the directory is
+        reused and the script is reused while the code stays the same
+        """
+        if path in self.scripts and self.scripts[path][0] == code:
+            return self.scripts[path][1]
+        directory = os.path.dirname(os.path.abspath(path)) if path else None
+        if directory not in self.projects:
+            self.projects[directory] = (jedi.Project(directory) if directory
+                                        else jedi.get_default_project())
+        script = jedi.Script(code, path=path or None,
+                             project=self.projects[directory])
+        self.scripts[path] = (code, script)
+        return script
 
-    def auto_complete(self, code, column, line):
-        """Python auto complete"""
-        if code != '' and code.split('\n')[line] != '':
-            script = jedi.Script(code, path='')
+    def auto_complete(self, code, column, line, path=None):
+        """Python auto complete, `line` and `column` start from 1"""
+        lines = code.split('\n')
+        if code != '' and line <= len(lines) and lines[line - 1] != '':
             try:
-                return script.complete(line + 1, column)
-            except AttributeError:
+                return self.get_script(code, path).complete(line, column - 1)
+            except (AttributeError, ValueError):
                 return []
         return []
@@ -1,19 +1,293 @@
 """Linter for python language"""
 import ast
-from .constants import SYNTAX_ERROR
+import builtins
+
+from .constants import SYNTAX_ERROR, UNDEFINED_ERROR, UNUSED_IMPORT_ERROR
+
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef,
+          ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+# Lines that start at the first column but continue the statement before
+CONTINUATIONS = ('else', 'elif', 'except', 'finally', ')', ']', '}', '#')
+MODULE_NAMES = {'__name__', '__file__', '__doc__', '__builtins__',
+                '__spec__', '__loader__', '__package__', '__path__',
+                '__annotations__'}
+CLASS_NAMES = {'__module__', '__qualname__'}
+KNOWN_NAMES = set(dir(builtins)) | MODULE_NAMES
+BLOCK_CACHE_SIZE = 8192
+
+
+def split_blocks(code):
+    """
+    Splits code into its top level statements and returns a list of
+    (first line index, text) pairs, decorators stay with their definition
+    """
+    blocks = []
+    start = 0
+    lines = code.split('\n')
+    for index, line in enumerate(lines):
+        if (index > 0 and line and line[0] not in ' \t'
+                and not line.startswith(CONTINUATIONS)
+                and not lines[start].startswith('@')):
+            blocks.append((start, '\n'.join(lines[start:index])))
+            start = index
+        elif line.startswith('@') and not lines[start].startswith('@'):
+            blocks.append((start, '\n'.join(lines[start:index])))
+            start = index
+    blocks.append((start, '\n'.join(lines[start:])))
+    return [block for block in blocks if block[1].strip()]
+
+
+def outer_parts(node):
+    """Returns the parts of a scope that are run in the scope around it"""
+    if isinstance(node, FUNCTIONS):
+        arguments = node.args
+        parts = arguments.defaults + [i for i in arguments.kw_defaults
+                                      if i is not None]
+        if not isinstance(node, ast.Lambda):
+            parts += node.decorator_list
+            parts += [i.annotation for i in all_arguments(arguments)
+                      if i.annotation is not None]
+            if node.returns is not None:
+                parts.append(node.returns)
+        return parts
+    if isinstance(node, ast.ClassDef):
+        return (node.decorator_list + node.bases
+                + [i.value for i in node.keywords])
+    return [node.generators[0].iter]
+
+
+def inner_parts(node):
+    """Returns the parts of a scope that are run in the scope itself"""
+    if isinstance(node, ast.Lambda):
+        return [node.body]
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                         ast.ClassDef)):
+        return node.body
+    generators = node.generators
+    parts = ([i.target for i in generators]
+             + [j for i in generators for j in i.ifs]
+             + [i.iter for i in generators[1:]])
+    if isinstance(node, ast.DictComp):
+        return parts + [node.key, node.value]
+    return parts + [node.elt]
+
+
+def all_arguments(arguments):
+    """Returns every argument of a function"""
+    return (arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+            + [i for i in (arguments.vararg, arguments.kwarg)
+               if i is not None])
+
+
+def walrus_targets(node):
+    """
+    Returns the names that assignment expressions in a comprehension and
+    the comprehensions in it bind, which belong to the scope around them
+    """
+    names = set()
+    stack = inner_parts(node)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.NamedExpr):
+            names.add(node.target.id)
+        if isinstance(node, SCOPES) and not isinstance(node,
+                                                       COMPREHENSIONS):
+            stack.extend(outer_parts(node))
+        else:
+            stack.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def scope_nodes(roots):
+    """Yields the nodes of a scope without going into the scopes in it"""
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        yield node
+        if isinstance(node, SCOPES):
+            stack.extend(outer_parts(node))
+        else:
+            stack.extend(ast.iter_child_nodes(node))
+
+
+class BlockAnalysis():
+    """
+    What a top level statement defines and uses, line numbers start from
+    the first line of the statement
+    """
+    def __init__(self, code):
+        self.error = None
+        self.defined = set()
+        self.imports = []
+        self.uses = []
+        self.exported = set()
+        self.has_star_import = False
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError) as exception:
+            self.error = (getattr(exception, 'lineno', None) or 1,
+                          exception.args[0], getattr(exception, 'offset', 0))
+            return
+        self.analyze_scope(tree.body, None, [])
+
+    def analyze_scope(self, roots, scope, enclosing):
+        """
+        Finds the names a scope uses from the module, `scope` is the node
+        of the scope or None for the module and `enclosing` the names bound
+        in the functions around it
+        """
+        nodes = list(scope_nodes(roots))
+        bound = set()
+        global_names = set()
+        if isinstance(scope, FUNCTIONS):
+            bound.update(i.arg for i in all_arguments(scope.args))
+        for node in nodes:
+            if (isinstance(node, ast.Name)
+                    and not isinstance(node.ctx, ast.Load)):
+                bound.add(node.id)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                   ast.ClassDef)):
+                bound.add(node.name)
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                for alias in node.names:
+                    if alias.name == '*':
+                        self.has_star_import = True
+                        continue
+                    name = alias.asname or alias.name.split('.')[0]
+                    bound.add(name)
+                    if scope is None:
+                        self.imports.append((name, node.lineno,
+                                             node.col_offset))
+            elif isinstance(node, ast.Global):
+                global_names.update(node.names)
+            elif isinstance(node, (ast.ExceptHandler, ast.MatchAs,
+                                   ast.MatchStar)) and node.name:
+                bound.add(node.name)
+            elif isinstance(node, ast.MatchMapping) and node.rest:
+                bound.add(node.rest)
+            elif (isinstance(node, COMPREHENSIONS)
+                  and not isinstance(scope, COMPREHENSIONS)):
+                bound.update(walrus_targets(node))
+        if isinstance(scope, COMPREHENSIONS):
+            bound -= {node.target.id for node in nodes
+                      if isinstance(node, ast.NamedExpr)}
+
+        if scope is None:
+            self.defined.update(bound)
+            self.find_exported(nodes)
+        else:
+            self.defined.update(global_names)
+            bound -= global_names
+        if isinstance(scope, ast.ClassDef):
+            bound |= CLASS_NAMES
+
+        for node in nodes:
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                if scope is None or (node.id not in bound and not any(
+                        node.id in names for names in enclosing)):
+                    self.uses.append((node.id, node.lineno, node.col_offset))
+            elif isinstance(node, SCOPES):
+                if scope is None or isinstance(scope, ast.ClassDef):
+                    inner_enclosing = enclosing
+                else:
+                    inner_enclosing = enclosing + [bound]
+                self.analyze_scope(inner_parts(node), node, inner_enclosing)
+
+    def find_exported(self, nodes):
+        """Finds the names in `__all__`"""
+        for node in nodes:
+            if (isinstance(node, ast.Assign)
+                    and any(isinstance(i, ast.Name) and i.id == '__all__'
+                            for i in node.targets)
+                    and isinstance(node.value, (ast.List, ast.Tuple))):
+                self.exported.update(
+                    i.value for i in node.value.elts
+                    if isinstance(i, ast.Constant)
+                )
 
 
 class Extension():
     """Extension"""
     def __init__(self):
         self.commands = {'editor.linter:py': self.linter}
+        self.blocks = {}
+
+    def analyze(self, code):
+        """
+        Returns the analysis of the top level statements of the code with
+        the index of their first lines
+
+        The analysis of a statement is kept while its text stays the same,
+        so only the statements that changed are parsed again, the cache
+        starts over with the current statements once it is full. When
+        statements do not parse, the code from the first to the last of
+        them is analyzed as one statement, which is right when the split
+        was wrong, like in a string with lines that start at the first
+        column, and otherwise holds the error of the first of them.
+        """
+        blocks = {}
+        analyses = []
+        for start, text in split_blocks(code):
+            analyses.append((start, self.block_analysis(text, blocks)))
+        failed = [index for index, (_, analysis) in enumerate(analyses)
+                  if analysis.error is not None]
+        if failed and failed[0] != failed[-1]:
+            first, last = failed[0], failed[-1]
+            lines = code.split('\n')
+            start = analyses[first][0]
+            end = (analyses[last + 1][0] if last + 1 < len(analyses)
+                   else len(lines))
+            analyses[first:last + 1] = [(start, self.block_analysis(
+                '\n'.join(lines[start:end]), blocks
+            ))]
+        if len(self.blocks) + len(blocks) > BLOCK_CACHE_SIZE:
+            self.blocks = blocks
+        else:
+            self.blocks.update(blocks)
+        return analyses
+
+    def block_analysis(self, text, blocks):
+        """
+        Returns the kept analysis of a statement or analyzes it, `blocks`
+        gets the analyses that are used
+        """
+        analysis = self.blocks.get(text) or blocks.get(text)
+        if analysis is None:
+            analysis = BlockAnalysis(text)
+        blocks[text] = analysis
+        return analysis
 
     def linter(self, code):
         """Python linter"""
+        analyses = self.analyze(code)
         errors = []
-        try:
-            ast.parse(code)
-        except (SyntaxError, IndentationError) as exception:
-            errors.append((exception.lineno, *SYNTAX_ERROR,
-                           exception.args[0], exception.offset))
+        for start, analysis in analyses:
+            if analysis.error is not None:
+                line, message, offset = analysis.error
+                return [(start + line, *SYNTAX_ERROR, message, offset)]
+
+        defined = set(KNOWN_NAMES)
+        used = set()
+        has_star_import = False
+        for _, analysis in analyses:
+            defined |= analysis.defined
+            used.update(name for name, _, _ in analysis.uses)
+            used |= analysis.exported
+            has_star_import |= analysis.has_star_import
+
+        for start, analysis in analyses:
+            if has_star_import is False:
+                for name, line, column in analysis.uses:
+                    if name not in defined:
+                        errors.append((start + line, *UNDEFINED_ERROR,
+                                       f'undefined name {name!r}',
+                                       column + 1))
+            for name, line, column in analysis.imports:
+                if name not in used:
+                    errors.append((start + line, *UNUSED_IMPORT_ERROR,
+                                   f'{name!r} imported but unused',
+                                   column + 1))
+        errors.sort(key=lambda error: error[0])
         return errors
@@ -0,0 +1,312 @@
+"""Finding and replacing text in the files of a project"""
+import mmap
+import os
+import re
+
+from .search import compile_query
+from .save import write_atomically
+from .settings import CONFIGS
+
+# A file is binary when there is a NUL byte in this many bytes at its start
+BINARY_CHECK = 8192
+# A worker process is given at most this many files or bytes at once
+SHARD_FILES = 256
+SHARD_BYTES = 8 * 1024 * 1024
+# Characters of a matching line that are kept to be shown
+LINE_PREVIEW = 200
+
+
+def walk(root, ignored, binary):
+    """
+    Yields the relative path, size and modification time of the files of a
+    project, without the directories in `ignored` and the files with an
+    extension in `binary`
+    """
+    directories = ['']
+    while directories:
+        directory = directories.pop()
+        try:
+            with os.scandir(os.path.join(root, directory)) as iterator:
+                entries = list(iterator)
+        except OSError:
+            continue
+        for entry in entries:
+            path = os.path.join(directory, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in ignored:
+                        directories.append(path)
+                elif (entry.is_file(follow_symlinks=False)
+                      and os.path.splitext(entry.name)[1].lower()
+                      not in binary):
+                    info = entry.stat(follow_symlinks=False)
+                    yield path, info.st_size, info.st_mtime_ns
+            except OSError:
+                continue
+
+
+def find_hits(data, pattern, encoding, limit):
+    """
+    Returns the (line, column, length, text) hits of the first `limit`
+    matches of a pattern in the bytes of a file
+    """
+    hits = []
+    line = 0
+    counted = 0
+    for match in pattern.finditer(data):
+        start, end = match.span()
+        if start == end:
+            continue
+        line += data[counted:start].count(b'\n')
+        counted = start
+        line_start = data.rfind(b'\n', 0, start) + 1
+        line_end = data.find(b'\n', start)
+        if line_end == -1:
+            line_end = len(data)
+        column = len(data[line_start:start].decode(encoding, 'replace'))
+        length = len(data[start:min(end, line_end)].decode(encoding,
+                                                           'replace'))
+        text = data[line_start:min(line_end, start + LINE_PREVIEW * 4)]
+        text = text.decode(encoding, 'replace')[:column + LINE_PREVIEW]
+        hits.append((line, column, length, text))
+        if len(hits) == limit:
+            break
+    return hits
+
+
+def grep_files(root, files, query, is_regex, encoding, limit):
+    """
+    Finds a query in some files, called in a worker process
+
+    Every file is mapped and searched as bytes, the ones with a NUL byte at
+    their start are skipped as binary. Returns the (path, modification
+    time, hits) of the files that match, with at most `limit` hits each,
+    and how many files were skipped.
+    """
+    pattern = compile_query(query, is_regex, encoding)
+    found = []
+    skipped = 0
+    for path, size, mtime in files:
+        if size == 0:
+            continue
+        try:
+            with open(os.path.join(root, path), 'rb') as file, mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data.find(b'\0', 0, BINARY_CHECK) != -1:
+                    skipped += 1
+                    continue
+                hits = find_hits(data, pattern, encoding, limit)
+        except (OSError, ValueError):
+            continue
+        if hits:
+            found.append((path, mtime, hits))
+    return found, skipped
+
+
+def replaced_chunks(data, pattern, substitute):
+    """Yields the bytes of a file with every match of a pattern replaced"""
+    position = 0
+    for match in pattern.finditer(data):
+        if match.end() > match.start():
+            yield data[position:match.start()]
+            yield substitute(match)
+            position = match.end()
+    yield data[position:]
+
+
+def replace_in_files(root, files, query, is_regex, encoding, replacement):
+    """
+    Replaces a query in some (path, modification time, reviewed matches)
+    files, called in a worker process
+
+    A file is only written when its modification time is still the one it
+    had when it was searched and it has no more matches than were shown.
+    Returns how many matches were replaced, the paths of the files that
+    had changed or could not be written and the paths of the files that
+    had more matches than were shown.
+    """
+    pattern = compile_query(query, is_regex, encoding)
+    template = replacement.encode(encoding)
+
+    def substitute(match):
+        return match.expand(template) if is_regex is True else template
+
+    count = 0
+    failed = []
+    unreviewed = []
+    for path, mtime, reviewed in files:
+        full_path = os.path.join(root, path)
+        try:
+            if os.stat(full_path).st_mtime_ns != mtime:
+                failed.append(path)
+                continue
+            # The file is read instead of mapped, a mapped file can not be
+            # replaced on every system
+            with open(full_path, 'rb') as file:
+                data = file.read()
+            matches = sum(1 for match in pattern.finditer(data)
+                          if match.end() > match.start())
+            if matches > reviewed:
+                unreviewed.append(path)
+            elif matches > 0:
+                write_atomically(full_path, replaced_chunks(data, pattern,
+                                                            substitute))
+                count += matches
+        except (OSError, re.error):
+            failed.append(path)
+    return count, failed, unreviewed
+
+
+class ProjectSearch():
+    """
+    Finds and replaces a query in the files of a project with a pool of
+    worker processes
+
+    A thread walks the project and gives its files to the pool in shards of
+    at most `SHARD_FILES` files or `SHARD_BYTES` bytes, so a search is as
+    fast as the pool has processes. `callback` is called on the loop thread
+    with the files that match as soon as every shard is done, so they can
+    be shown while the others are searched.
+    """
+    def __init__(self, reactor, pool, root, callback):
+        self.reactor = reactor
+        self.pool = pool
+        self.root = root
+        self.callback = callback
+
+        self.query = ''
+        self.is_regex = False
+        self.generation = 0
+        self.futures = []
+        self.file_count = 0
+        self.searched_count = 0
+        self.skipped_count = 0
+        self.is_walking = False
+        self.is_done = True
+
+    def start(self, query, is_regex):
+        """Starts finding a query, the last search is stopped"""
+        self.cancel()
+        self.query = query
+        self.is_regex = is_regex
+        self.file_count = 0
+        self.searched_count = 0
+        self.skipped_count = 0
+        self.is_walking = True
+        self.is_done = False
+        generation = self.generation
+        self.reactor.run_in_background(
+            self.shard, generation, self.futures,
+            callback=lambda future: self.walked(generation, future)
+        )
+
+    def cancel(self):
+        """Stops the search or replace that is running"""
+        self.generation += 1
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+        self.is_walking = False
+        self.is_done = True
+
+    def shard(self, generation, futures):
+        """
+        Walks the project and gives its files to the pool, called on a
+        thread, the futures of the shards are added to `futures`
+        """
+        batch = []
+        size = 0
+        for file in walk(self.root, CONFIGS['finder.ignored_directories'],
+                         CONFIGS['finder.binary_extensions']):
+            if generation != self.generation or self.reactor.is_closed:
+                return
+            batch.append(file)
+            size += file[1]
+            if len(batch) == SHARD_FILES or size >= SHARD_BYTES:
+                self.submit(generation, futures, batch)
+                batch = []
+                size = 0
+        if batch and generation == self.generation:
+            self.submit(generation, futures, batch)
+
+    def submit(self, generation, futures, batch):
+        """Gives a shard of files to the pool"""
+        self.file_count += len(batch)
+        future = self.pool.submit(grep_files, self.root, batch, self.query,
+                                  self.is_regex, CONFIGS['default_encoding'],
+                                  CONFIGS['grep.max_file_hits'])
+        futures.append(future)
+        self.reactor.watch_future(future, lambda done: self.searched(
+            generation, len(batch), done
+        ))
+
+    def walked(self, generation, future):
+        """Notes that every file of the project has been given to the pool"""
+        if generation != self.generation:
+            return
+        if future.exception() is not None:
+            self.cancel()
+            self.callback([])
+            return
+        self.is_walking = False
+        self.update_done()
+
+    def searched(self, generation, count, future):
+        """Passes on the files that a shard has found"""
+        if generation != self.generation or future.cancelled():
+            return
+        self.futures.remove(future)
+        self.searched_count += count
+        found = []
+        if future.exception() is None:
+            found, skipped = future.result()
+            self.skipped_count += skipped
+        self.update_done()
+        self.callback(found)
+
+    def update_done(self):
+        """Marks the search as done once every shard has been searched"""
+        if self.is_walking is False and not self.futures:
+            self.is_done = True
+
+    def replace(self, files, replacement, callback):
+        """
+        Replaces the query in the (path, modification time, reviewed
+        matches) files of this search and calls `callback` with how many
+        matches were replaced, the files that had changed or could not be
+        written and the files that had more matches than were reviewed
+        """
+        self.cancel()
+        self.is_done = False
+        generation = self.generation
+        shards = [files[i:i + SHARD_FILES]
+                  for i in range(0, len(files), SHARD_FILES)]
+        results = []
+        for shard in shards:
+            future = self.pool.submit(
+                replace_in_files, self.root, shard, self.query, self.is_regex,
+                CONFIGS['default_encoding'], replacement
+            )
+            self.futures.append(future)
+            self.reactor.watch_future(future, lambda done, shard=shard:
+                                      self.replaced(generation, shard, done,
+                                                    results, callback))
+        if not shards:
+            self.is_done = True
+            callback(0, [], [])
+
+    def replaced(self, generation, shard, future, results, callback):
+        """Collects the results of the shards of a replace"""
+        if generation != self.generation or future.cancelled():
+            return
+        self.futures.remove(future)
+        if future.exception() is None:
+            results.append(future.result())
+        else:
+            results.append((0, [path for path, _, _ in shard], []))
+        if not self.futures:
+            self.is_done = True
+            callback(sum(count for count, _, _ in results),
+                     [path for _, failed, _ in results for path in failed],
+                     [path for _, _, unreviewed in results
+                      for path in unreviewed])
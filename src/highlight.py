@@ -0,0 +1,168 @@
+"""Incremental syntax highlighting"""
+import io
+
+from pygments.lexer import RegexLexer
+from pygments.token import Error, Whitespace, _TokenType
+
+ROOT_STACK = ('root',)
+# How far before a line lexing starts when the lines before are not known
+SYNC_LINES = 300
+
+
+def lex_line(lexer, text, stack):
+    """
+    Lexes a line starting with the state stack `stack` and returns its
+    (token type, value) pairs and the state stack at its end
+
+    This is the loop of `RegexLexer.get_tokens_unprocessed`, which does not
+    give the stack it ends with back. Other lexers are used without state.
+    """
+    if (type(lexer).get_tokens_unprocessed
+            is not RegexLexer.get_tokens_unprocessed):
+        return [i for i in lexer.get_tokens(text)], ROOT_STACK
+
+    tokens = []
+    position = 0
+    tokendefs = lexer._tokens
+    statestack = list(stack)
+    statetokens = tokendefs[statestack[-1]]
+    while True:
+        for rexmatch, action, new_state in statetokens:
+            match = rexmatch(text, position)
+            if match:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        tokens.append((action, match.group()))
+                    else:
+                        tokens.extend((token, value) for _, token, value
+                                      in action(lexer, match))
+                position = match.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == '#pop':
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == '#push':
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == '#push':
+                        statestack.append(statestack[-1])
+                    statetokens = tokendefs[statestack[-1]]
+                break
+        else:
+            if position >= len(text):
+                break
+            if text[position] == '\n':
+                statestack = list(ROOT_STACK)
+                statetokens = tokendefs['root']
+                tokens.append((Whitespace, '\n'))
+            else:
+                tokens.append((Error, text[position]))
+            position += 1
+    return tokens, tuple(statestack)
+
+
+def strip_newline(tokens):
+    """Removes the line break at the end of the tokens of a line"""
+    if tokens and tokens[-1][1].endswith('\n'):
+        token, value = tokens.pop()
+        if value != '\n':
+            tokens.append((token, value[:-1]))
+    return tokens
+
+
+def slice_tokens(tokens, start, end):
+    """Returns the tokens of characters `start` to `end`"""
+    sliced = []
+    position = 0
+    for token, value in tokens:
+        value_end = position + len(value)
+        if value_end > start and position < end:
+            sliced.append((token, value[max(0, start - position):
+                                         end - position]))
+        position = value_end
+        if position >= end:
+            break
+    return sliced
+
+
+class Highlighter():
+    """
+    Highlights a document line by line
+
+    Every line keeps the lexer state it starts with, its tokens, the state
+    it ends with and its last ANSI output. After an edit only the changed
+    lines are lexed again, and the lines after them only until the state at
+    the start of a line is the same as before.
+
+    Lines up to `checked_lines` are known to be lexed from the start of the
+    document. A line far after them is lexed from `SYNC_LINES` lines before
+    it, guessing that the lexer is in its root state there, and the guess
+    is corrected once the lines before it are checked.
+    """
+    def __init__(self, document, lexer, formatter):
+        self.document = document
+        self.lexer = lexer
+        self.formatter = formatter
+        self.lines = []
+        self.checked_lines = 0
+
+    def lines_changed(self, line, removed, added):
+        """
+        Forgets lines `line` to `line + removed`, which are now lines `line`
+        to `line + added`, and returns True if the lines after them are
+        highlighted differently now
+        """
+        self.checked_lines = min(self.checked_lines, line)
+        if line >= len(self.lines):
+            return False
+        if line + removed < len(self.lines):
+            old_entry = self.lines[line + removed]
+        else:
+            old_entry = None
+        self.lines[line:line + removed + 1] = [None] * (added + 1)
+        self.update(line + added)
+        return old_entry is None or old_entry[1] != self.lines[line + added][1]
+
+    def update(self, line):
+        """Lexes the lines before `line` that are not up to date"""
+        if line < self.checked_lines:
+            return
+        if len(self.lines) <= line:
+            self.lines.extend([None] * (line + 1 - len(self.lines)))
+        if line - self.checked_lines > SYNC_LINES:
+            start = line - SYNC_LINES
+            stack = ROOT_STACK
+        else:
+            start = self.checked_lines
+            stack = (self.lines[start - 1][1] if start > 0
+                     else ROOT_STACK)
+        for index in range(start, line + 1):
+            entry = self.lines[index]
+            if entry is None or entry[0] != stack:
+                tokens, end_stack = lex_line(
+                    self.lexer, self.document.line(index) + '\n', stack
+                )
+                entry = [stack, end_stack, strip_newline(tokens), None, None]
+                self.lines[index] = entry
+            stack = entry[1]
+        if start == self.checked_lines:
+            self.checked_lines = line + 1
+
+    def highlight(self, line, start, end):
+        """Returns the ANSI text of characters `start` to `end` of a line"""
+        self.update(line)
+        entry = self.lines[line]
+        if entry[3] != (start, end):
+            output = io.StringIO()
+            self.formatter.format(slice_tokens(entry[2], start, end), output)
+            entry[3] = (start, end)
+            entry[4] = output.getvalue()
+        return entry[4]
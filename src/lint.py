@@ -0,0 +1,60 @@
+"""Background linting"""
+from .service import RemoteCommand
+from .settings import CONFIGS
+
+
+class LintScheduler():
+    """
+    Runs a linter on a worker thread once the text has not changed for
+    `editor.lint_delay` seconds
+
+    The linter gets a snapshot of the document, so the text is never
+    joined on the loop thread. Every result is tagged with the version of
+    the document it was made from and is dropped if the document has
+    changed since then.
+    """
+    def __init__(self, reactor, linter, document, callback):
+        self.reactor = reactor
+        self.linter = linter
+        self.document = document
+        self.callback = callback
+
+        self.timer = None
+        self.is_running = False
+        self.is_pending = False
+
+    def schedule(self):
+        """Lints the document after it stops changing"""
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.reactor.call_later(CONFIGS['editor.lint_delay'],
+                                             self.run)
+
+    def run(self):
+        """Starts linting the document now"""
+        self.timer = None
+        if self.is_running is True:
+            self.is_pending = True
+            return
+        self.is_running = True
+        version = self.document.version
+        if isinstance(self.linter, RemoteCommand):
+            future = self.linter.submit(self.document)
+        else:
+            future = self.reactor.run_in_background(self.lint,
+                                                    self.document.snapshot())
+        self.reactor.watch_future(future,
+                                  lambda done: self.done(version, done))
+
+    def lint(self, snapshot):
+        """Runs the linter on a snapshot, called on a worker thread"""
+        return self.linter(snapshot.to_string())
+
+    def done(self, version, future):
+        """Passes the result to the callback if it is not stale"""
+        self.is_running = False
+        if self.is_pending is True:
+            self.is_pending = False
+            self.run()
+        if version == self.document.version and future.exception() is None:
+            self.callback(future.result())
@@ -3,6 +3,21 @@ import tkinter as tk
 from tkinter import filedialog
 
 
+def ask_save_path():
+    """
+    Asks for the file to save to with a dialog, returns an empty string
+    when none is chosen or no dialog can be shown
+    """
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return ''
+    root.withdraw()
+    file_path = filedialog.asksaveasfilename()
+    root.destroy()
+    return file_path
+
+
 class Strawberry():
     """Strawberry menu"""
     name = 'Strawberry'
@@ -30,17 +45,18 @@ class File():
 
     def save(self, window):
         """Save an file"""
-        with open(window.file_name, 'w', encoding='utf8') as file:
-            code = '\n'.join([''.join(i) for i in window.input])
-            file.write(code)
+        tab = window.tabs[window.current_tab]
+        if hasattr(tab, 'save'):
+            tab.save()
 
     def save_as(self, window):
         """Saves an file as ..."""
-        root = tk.Tk()
-        root.withdraw()
-        file_path = filedialog.asksaveasfilename()
-        window.open_file(file_path)
-        self.save(window)
+        tab = window.tabs[window.current_tab]
+        if not hasattr(tab, 'save'):
+            return
+        file_path = ask_save_path()
+        if file_path:
+            tab.save(file_path)
 
 
 class Edit():
@@ -49,4 +65,24 @@ class Edit():
     list = ['Undo     Ctrl + z',
             'Redo     Ctrl + y',
             'Paste    Ctrl + v']
-    exec = [lambda _: None for i in range(3)]
+
+    def __init__(self):
+        self.exec = [self.undo, self.redo, self.paste]
+
+    def undo(self, window):
+        """Undoes the last edit"""
+        tab = window.tabs[window.current_tab]
+        if hasattr(tab, 'undo'):
+            tab.undo()
+
+    def redo(self, window):
+        """Redoes the last undone edit"""
+        tab = window.tabs[window.current_tab]
+        if hasattr(tab, 'redo'):
+            tab.redo()
+
+    def paste(self, window):
+        """Pastes the clipboard"""
+        tab = window.tabs[window.current_tab]
+        if hasattr(tab, 'paste'):
+            tab.paste()
@@ -0,0 +1,139 @@
+"""Frame, keystroke and extension command timing"""
+import collections
+import json
+import os
+import threading
+import time
+
+# How many of the last times of a kind the HUD averages
+HUD_SAMPLES = 60
+# The kinds of extension commands the HUD shows and their labels
+HUD_HANDLERS = (('editor.highlight', 'hl'), ('editor.linter', 'lint'),
+                ('editor.auto_complete', 'ac'))
+
+
+def milliseconds(seconds):
+    """Returns a time as milliseconds for the HUD"""
+    return f'{seconds * 1000:.1f}ms'
+
+
+def write_trace(path, spans, origin):
+    """Writes spans to a file and returns how many there were"""
+    events = [{'name': name, 'ph': 'X', 'ts': (start - origin) * 1e6,
+               'dur': duration * 1e6, 'pid': pid, 'tid': tid, 'args': args}
+              for name, start, duration, pid, tid, args in spans]
+    with open(path, 'w', encoding='utf8') as file:
+        if path.endswith('.jsonl'):
+            for event in events:
+                file.write(json.dumps(event) + '\n')
+        else:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                      file)
+    return len(events)
+
+
+class Metrics():
+    """
+    Keeps the last `size` timed spans of a window
+
+    A span is a (name, start, duration, pid, tid, args) tuple with times
+    from `time.perf_counter`. Frames, key presses, the time from a key to
+    the frame that shows it and extension commands are recorded, from any
+    thread. The last times of every kind of span are kept for the HUD.
+    """
+    def __init__(self, size):
+        self.spans = collections.deque(maxlen=size)
+        self.recent = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+        self.key_time = None
+        self.frame_bytes = 0
+
+    def record(self, name, start, args=None, pid=None, tid=None,
+               end=None):
+        """Records a span that started at `start` and ends now or at `end`"""
+        duration = (time.perf_counter() if end is None else end) - start
+        kind = name.split(':', 1)[0]
+        with self.lock:
+            self.spans.append((name, start, duration, pid or self.pid,
+                               threading.get_ident() if tid is None else tid,
+                               args or {}))
+            if kind not in self.recent:
+                self.recent[kind] = collections.deque(maxlen=HUD_SAMPLES)
+            self.recent[kind].append(duration)
+
+    def key_pressed(self, start):
+        """Records a key press, the first one since a frame waits for it"""
+        if self.key_time is None:
+            self.key_time = start
+        self.record('key', start)
+
+    def frame_drawn(self, start, frame_bytes):
+        """
+        Records a frame and the time since the first key it shows was
+        pressed, keys that change nothing on the screen are not counted
+        """
+        end = time.perf_counter()
+        self.frame_bytes = frame_bytes
+        self.record('frame', start, {'bytes': frame_bytes}, end=end)
+        if self.key_time is not None and frame_bytes > 0:
+            self.record('latency', self.key_time, end=end)
+        self.key_time = None
+
+    def last(self, kind):
+        """
+        Returns the last time of a kind of span or None, called with the
+        lock held
+        """
+        times = self.recent.get(kind)
+        return times[-1] if times else None
+
+    def average(self, kind):
+        """
+        Returns the average of the last times of a kind of span or None,
+        called with the lock held
+        """
+        times = self.recent.get(kind)
+        return sum(times) / len(times) if times else None
+
+    def hud(self):
+        """Returns the text of the HUD"""
+        parts = []
+        with self.lock:
+            if self.last('frame') is not None:
+                parts.append(f'frame {milliseconds(self.last("frame"))} max '
+                             f'{milliseconds(max(self.recent["frame"]))}')
+            if self.last('latency') is not None:
+                parts.append(f'key {milliseconds(self.last("latency"))}')
+            parts.append(f'{self.frame_bytes}B')
+            for kind, label in HUD_HANDLERS:
+                if self.average(kind) is not None:
+                    parts.append(f'{label} '
+                                 f'{milliseconds(self.average(kind))}')
+        return ' '.join(parts)
+
+    def export(self, path):
+        """
+        Writes the spans to a file, as JSON lines if its name ends with
+        `.jsonl` and as a Chrome trace otherwise, called on a worker thread
+        """
+        with self.lock:
+            spans = list(self.spans)
+        return write_trace(path, spans, self.origin)
+
+
+class TimedCommand():
+    """An extension command that records a span every time it runs"""
+    def __init__(self, metrics, name, command):
+        self.metrics = metrics
+        self.name = name
+        self.command = command
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.command(*args, **kwargs)
+        finally:
+            self.metrics.record(self.name, start)
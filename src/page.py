@@ -2,18 +2,55 @@
 
 
 class Page():
-    """Editors Base Class"""
+    """
+    Editors Base Class
+
+    `damage` holds what has to be drawn in the next frame, it is True when
+    the whole page has to be drawn, None when nothing has changed or a set
+    of the terminal lines that have changed.
+    """
+    damage = True
+
     def __init_subclass__(cls):
         cls.keys = {None: cls.__event_keypress__}
 
     def __event_keypress__(self, key):
         pass
 
+    def __event_paste__(self, text):
+        pass
+
     def __update__(self):
         pass
 
     def __draw__(self):
         return ''
 
+    def __draw_lines__(self, lines):
+        """Draws some terminal lines of the page, by default the whole page"""
+        self.__draw__()
+
     def __cursor__(self):
         return {'is_hidden': False, 'position': [0, 0]}
+
+    def invalidate(self, start=None, stop=None):
+        """
+        Marks terminal lines `start` to `stop` (or just `start`) as changed,
+        or the whole page when no line is given
+        """
+        if start is None or self.damage is True:
+            self.damage = True
+        else:
+            if self.damage is None:
+                self.damage = set()
+            self.damage.update(range(start, start + 1 if stop is None
+                                     else stop))
+        window = getattr(self, 'window', None)
+        if window is not None:
+            window.request_redraw()
+
+    def take_damage(self):
+        """Returns the damage of the page and marks it as drawn"""
+        damage = self.damage
+        self.damage = None
+        return damage
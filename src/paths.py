@@ -0,0 +1,228 @@
+"""Paths of the files in a project"""
+import collections
+import heapq
+import itertools
+import os
+import re
+import time
+
+from .settings import CONFIGS
+
+# Characters of the text that are searched between two checks of the clock
+SEARCH_SLICE = 64 * 1024
+# Seconds between two updates of the paths while a project is crawled
+PUBLISH_INTERVAL = 0.5
+
+
+def fuzzy_pattern(query):
+    """
+    Returns a pattern that finds the lines which have the characters of
+    `query` in order, every character stops at its first match so a line
+    is never searched twice
+    """
+    return re.compile('\n' + ''.join(
+        f'[^{char}\n]*{char}' for char in map(re.escape, query)
+    ) + '[^\n]*', re.IGNORECASE)
+
+
+def rank(path, query):
+    """
+    Returns the sort key of a path that matches a folded query, paths whose
+    file names start with or have the query in them come first
+    """
+    folded = path.lower()
+    name = folded[folded.rfind(os.sep) + 1:]
+    return (not name.startswith(query), query not in name,
+            query not in folded, len(path))
+
+
+class PathIndex():
+    """
+    The files of a project as one text with a line for each path
+
+    A worker thread crawls the project and after that checks the
+    modification times of its directories every `finder.poll_interval`
+    seconds, reading again only the directories that have changed. The
+    directories in `finder.ignored_directories` and the files with an
+    extension in `finder.binary_extensions` are left out. `callback` is
+    called on the loop thread whenever the paths have changed.
+    """
+    def __init__(self, reactor, root, callback):
+        self.reactor = reactor
+        self.root = root
+        self.callback = callback
+
+        self.directories = {}
+        self.text = ''
+        self.count = 0
+        self.is_crawled = False
+        self.reactor.run_in_background(self.crawl, callback=self.crawled)
+
+    def read_directory(self, directory):
+        """
+        Returns the modification time, the file names and the
+        subdirectories of a directory, called on a worker thread
+        """
+        ignored = CONFIGS['finder.ignored_directories']
+        binary = CONFIGS['finder.binary_extensions']
+        files = []
+        subdirectories = []
+        path = os.path.join(self.root, directory)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as iterator:
+                for entry in iterator:
+                    try:
+                        is_directory = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if is_directory is True:
+                        if entry.name not in ignored:
+                            subdirectories.append(os.path.join(directory,
+                                                               entry.name))
+                    elif os.path.splitext(entry.name)[1].lower() not in binary:
+                        files.append(entry.name)
+        except OSError:
+            mtime = None
+        return mtime, files, subdirectories
+
+    def read_tree(self, directory):
+        """Reads a directory and the directories in it, breadth first"""
+        last_publish = time.monotonic()
+        queue = collections.deque([directory])
+        while queue and self.reactor.is_closed is False:
+            directory = queue.popleft()
+            self.directories[directory] = self.read_directory(directory)
+            queue.extend(self.directories[directory][2])
+            if time.monotonic() - last_publish >= PUBLISH_INTERVAL:
+                last_publish = time.monotonic()
+                self.reactor.call_soon_threadsafe(self.update, *self.join())
+
+    def forget(self, directory):
+        """Forgets a directory and the directories in it"""
+        listing = self.directories.pop(directory, None)
+        if listing is not None:
+            for subdirectory in listing[2]:
+                self.forget(subdirectory)
+
+    def join(self):
+        """Returns the paths as text and how many they are"""
+        paths = []
+        for directory, (_, files, _) in list(self.directories.items()):
+            if directory == '':
+                paths += files
+            else:
+                prefix = directory + os.sep
+                paths += [prefix + name for name in files]
+        return '\n' + '\n'.join(paths) if paths else '', len(paths)
+
+    def crawl(self):
+        """Reads the whole project, called on a worker thread"""
+        self.read_tree('')
+        return self.join()
+
+    def refresh(self):
+        """
+        Reads the directories whose modification times have changed again
+        and returns the new text and count, or None if nothing has changed
+        """
+        has_changed = False
+        for directory in list(self.directories):
+            if directory not in self.directories:
+                continue
+            mtime, _, subdirectories = self.directories[directory]
+            try:
+                new_mtime = os.stat(os.path.join(self.root,
+                                                 directory)).st_mtime_ns
+            except OSError:
+                new_mtime = None
+            if new_mtime == mtime:
+                continue
+            has_changed = True
+            listing = self.read_directory(directory)
+            self.directories[directory] = listing
+            for subdirectory in set(subdirectories) - set(listing[2]):
+                self.forget(subdirectory)
+            for subdirectory in set(listing[2]) - set(subdirectories):
+                self.read_tree(subdirectory)
+        return self.join() if has_changed is True else None
+
+    def update(self, text, count):
+        """Keeps new paths and reports them"""
+        self.text = text
+        self.count = count
+        self.callback()
+
+    def crawled(self, future):
+        """Keeps the paths of the first crawl and starts polling"""
+        if future.exception() is None:
+            self.is_crawled = True
+            self.update(*future.result())
+            self.reactor.call_later(CONFIGS['finder.poll_interval'],
+                                    self.poll)
+
+    def poll(self):
+        """Looks for changed directories on a worker thread"""
+        self.reactor.run_in_background(self.refresh, callback=self.refreshed)
+
+    def refreshed(self, future):
+        """Keeps the paths of a poll that found changes"""
+        if future.exception() is None and future.result() is not None:
+            self.update(*future.result())
+        self.reactor.call_later(CONFIGS['finder.poll_interval'], self.poll)
+
+
+class PathSearch():
+    """
+    A ranked fuzzy search of the text of a `PathIndex`
+
+    A path matches when it has the characters of the query in order. The
+    text is searched in slices by `step`, so the best `limit` matches found
+    so far can be shown while the search goes on. A search for a longer
+    query can start from the matches of a finished one with `narrow`.
+    """
+    def __init__(self, text, query, limit):
+        self.text = text
+        self.query = query
+        self.folded_query = query.lower()
+        self.pattern = fuzzy_pattern(query)
+        self.limit = limit
+
+        self.position = 0
+        self.is_done = text == ''
+        self.matches = []
+        self.best = []
+
+    def narrow(self, query):
+        """
+        Returns a new search for a query that starts with this finished
+        search's query, which only searches the paths that matched
+        """
+        return PathSearch(''.join(self.matches), query, self.limit)
+
+    def step(self, budget):
+        """
+        Searches for about `budget` seconds and returns True once the
+        whole text has been searched
+        """
+        deadline = time.monotonic() + budget
+        while self.is_done is False:
+            end = self.text.find('\n', self.position + SEARCH_SLICE)
+            if end == -1:
+                end = len(self.text)
+            found = self.pattern.findall(self.text, self.position, end)
+            self.position = end
+            self.is_done = end == len(self.text)
+            self.matches += found
+            self.best = heapq.nsmallest(self.limit, itertools.chain(
+                self.best,
+                ((rank(path, self.folded_query), path)
+                 for path in (i[1:] for i in found))
+            ))
+            if time.monotonic() >= deadline:
+                break
+        return self.is_done
+
+    def results(self):
+        """Returns the best paths found so far"""
+        return [path for _, path in self.best]
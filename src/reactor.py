@@ -0,0 +1,140 @@
+"""Event loop"""
+import collections
+import heapq
+import itertools
+import selectors
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Timer():
+    """A function that will be called by the reactor at a deadline"""
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Stops the timer from running"""
+        self.cancelled = True
+
+
+class Reactor():
+    """
+    Single threaded event loop
+
+    Sleeps in a selector until a registered file becomes readable, a timer
+    is due or another thread passes a function to `call_soon_threadsafe`,
+    which wakes the selector up through a socket pair. Slow work is run on
+    a thread pool with `run_in_background` and its callback is called back
+    on the loop thread. An exception raised by a callback is passed to
+    `on_error` and the loop keeps running.
+    """
+    def __init__(self, workers=4, on_error=None):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []
+        self.ready = collections.deque()
+        self.running = False
+        self.is_closed = False
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.on_error = on_error
+
+        self._timer_counter = itertools.count()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self.add_reader(self._wakeup_reader, self._read_wakeup)
+
+    def _read_wakeup(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def add_reader(self, file, callback):
+        """Calls `callback` whenever `file` has something to read"""
+        self.selector.register(file, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, file):
+        """Stops watching a file"""
+        self.selector.unregister(file)
+
+    def call_later(self, delay, callback, *args):
+        """Calls `callback` after `delay` seconds and returns its timer"""
+        timer = Timer(time.monotonic() + delay, callback, args)
+        heapq.heappush(self.timers, (timer.deadline,
+                                     next(self._timer_counter), timer))
+        return timer
+
+    def call_soon_threadsafe(self, callback, *args):
+        """Calls `callback` on the loop thread, can be used from any thread"""
+        self.ready.append((callback, args))
+        try:
+            self._wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def run_in_background(self, function, *args, callback=None):
+        """
+        Runs `function` on a worker thread and then calls `callback` with
+        its future on the loop thread
+        """
+        future = self.executor.submit(function, *args)
+        if callback is not None:
+            self.watch_future(future, callback)
+        return future
+
+    def watch_future(self, future, callback):
+        """Calls `callback` with a future on the loop thread once it is done"""
+        future.add_done_callback(
+            lambda done: self.call_soon_threadsafe(callback, done)
+        )
+
+    def dispatch(self, callback, args):
+        """Calls a callback and reports what it raises to `on_error`"""
+        try:
+            callback(*args)
+        except Exception as error:  # pylint: disable=broad-except
+            if self.on_error is None:
+                raise
+            self.on_error(callback, error)
+
+    def stop(self):
+        """Stops the loop after the current callback"""
+        self.running = False
+
+    def run(self):
+        """Runs the loop until `stop` is called"""
+        self.running = True
+        while self.running:
+            if self.ready:
+                timeout = 0
+            elif self.timers:
+                timeout = max(0, self.timers[0][0] - time.monotonic())
+            else:
+                timeout = None
+
+            for key, _ in self.selector.select(timeout):
+                self.dispatch(key.data, ())
+
+            now = time.monotonic()
+            while self.timers and self.timers[0][0] <= now:
+                timer = heapq.heappop(self.timers)[2]
+                if timer.cancelled is False:
+                    self.ready.append((timer.callback, timer.args))
+
+            for _ in range(len(self.ready)):
+                if self.running is False:
+                    break
+                self.dispatch(*self.ready.popleft())
+
+    def close(self):
+        """Frees the resources of the loop"""
+        self.is_closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
@@ -0,0 +1,88 @@
+"""Saving documents"""
+import os
+import stat
+import tempfile
+
+from .settings import CONFIGS
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def write_atomically(path, chunks):
+    """
+    Writes chunks of bytes to a temporary file next to `path`, which is
+    synced and then renamed over it, so the file is never left half written
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(
+        prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            for chunk in chunks:
+                file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # The rename is only durable once the directory is synced
+        directory_descriptor = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
+
+
+class FileSaver():
+    """
+    Writes a document to its file on a worker thread
+
+    The text of a snapshot is written in chunks with `write_atomically`. On
+    the loop thread `progress` is called with the fraction written so far
+    and `callback` with None or the error once the save has finished.
+    """
+    def __init__(self, reactor, document, path, progress, callback):
+        self.reactor = reactor
+        self.document = document
+        self.path = path
+        self.progress = progress
+        self.callback = callback
+
+        self.is_running = False
+        self.is_pending = False
+
+    def save(self):
+        """Starts saving the document"""
+        if self.is_running is True:
+            self.is_pending = True
+            return
+        self.is_running = True
+        self.reactor.run_in_background(self.write, self.document.snapshot(),
+                                       self.path, callback=self.done)
+
+    def write(self, snapshot, path):
+        """Writes a snapshot to `path`, called on a worker thread"""
+        write_atomically(path, self.chunks(snapshot))
+
+    def chunks(self, snapshot):
+        """Yields the encoded chunks of a snapshot and reports progress"""
+        total = max(1, len(snapshot))
+        written = 0
+        for chunk, units in snapshot.chunks(CONFIGS['default_encoding'],
+                                            CHUNK_SIZE):
+            yield chunk
+            written += units
+            self.reactor.call_soon_threadsafe(self.progress, written / total)
+
+    def done(self, future):
+        """Reports the end of a save and starts the next one"""
+        self.is_running = False
+        self.callback(future.exception())
+        if self.is_pending is True:
+            self.is_pending = False
+            self.save()
@@ -0,0 +1,373 @@
+"""Finding text in a document"""
+import itertools
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Offsets of a document that are searched at once, chunks end at a line
+# break so a match never starts in one chunk and ends in the next
+SEARCH_CHUNK = 1024 * 1024
+# Matches that a worker thread collects before passing them on
+SEARCH_BATCH = 4096
+# Matches in a block of a `MatchIndex`
+MATCH_BLOCK = 2048
+# A longer literal query only searches the lines of the matches of the
+# shorter one instead of the whole document when there are at most this many
+NARROW_LIMIT = 5000
+
+
+def compile_query(query, is_regex, encoding=None):
+    """
+    Compiles a query for the text of a document, or for its bytes if it
+    has an encoding
+    """
+    if is_regex is False:
+        query = re.escape(query)
+    if encoding is None:
+        return re.compile(query, re.MULTILINE)
+    return re.compile(query.encode(encoding), re.MULTILINE)
+
+
+def chunks(document, start=0, end=None):
+    """
+    Yields the text between two offsets of a document as (offset, chunk)
+    pairs of about `SEARCH_CHUNK` that end at a line break
+    """
+    if end is None:
+        end = len(document)
+    newline = '\n' if document.encoding is None else b'\n'
+    position = start
+    while position < end:
+        chunk = document.slice(position, min(end, position + SEARCH_CHUNK))
+        if position + len(chunk) < end:
+            cut = chunk.rfind(newline) + 1
+            if cut > 0:
+                chunk = chunk[:cut]
+        yield position, chunk
+        position += len(chunk)
+
+
+def find_all(document, pattern, start=0, end=None):
+    """
+    Yields the matches of a pattern between two offsets of a document as
+    (start, end, match), without the empty ones
+    """
+    for position, chunk in chunks(document, start, end):
+        for match in pattern.finditer(chunk):
+            if match.end() > match.start():
+                yield position + match.start(), position + match.end(), match
+
+
+class MatchIndex():
+    """
+    Sorted offsets and lengths of the matches of a document
+
+    The matches are kept in blocks of at most `MATCH_BLOCK`, each with a
+    shift that is added to its offsets when they are read. An edit builds
+    again only the blocks it touches and adds its length change to the
+    shifts of the blocks after them, so it does not update every match
+    after it.
+    """
+    def __init__(self):
+        self.blocks = []
+        self.shifts = []
+        self.counts = []
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def locate(self, index):
+        """Returns the block of a match and its index in the block"""
+        block = bisect_right(self.counts, index) - 1
+        return block, index - self.counts[block]
+
+    def start(self, index):
+        """Returns the offset of a match"""
+        block, index = self.locate(index)
+        return self.blocks[block][0][index] + self.shifts[block]
+
+    def end(self, index):
+        """Returns the offset after a match"""
+        block, index = self.locate(index)
+        starts, lengths = self.blocks[block]
+        return starts[index] + self.shifts[block] + lengths[index]
+
+    def bisect(self, offset):
+        """Returns the index of the first match at or after an offset"""
+        low, high = 0, len(self.blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if self.blocks[middle][0][0] + self.shifts[middle] < offset:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return 0
+        block = low - 1
+        return self.counts[block] + bisect_left(self.blocks[block][0],
+                                                offset - self.shifts[block])
+
+    def block_matches(self, first, last):
+        """Returns the (offset, length) matches of some blocks"""
+        matches = []
+        for block in range(first, last):
+            starts, lengths = self.blocks[block]
+            shift = self.shifts[block]
+            matches += [(start + shift, length)
+                        for start, length in zip(starts, lengths)]
+        return matches
+
+    def rebuild(self, first, last, matches, delta):
+        """
+        Replaces blocks `first` to `last` with blocks of new matches and
+        moves the blocks after them by `delta`
+        """
+        new_blocks = [
+            (array('q', [i[0] for i in part]),
+             array('q', [i[1] for i in part]))
+            for part in (matches[i:i + MATCH_BLOCK]
+                         for i in range(0, len(matches), MATCH_BLOCK))
+        ]
+        self.blocks[first:last] = new_blocks
+        self.shifts[first:] = [0] * len(new_blocks) + [
+            shift + delta for shift in self.shifts[last:]
+        ]
+        self.counts = [0, *itertools.accumulate(
+            len(starts) for starts, _ in self.blocks
+        )][:len(self.blocks)]
+        self.total = (self.counts[-1] + len(self.blocks[-1][0])
+                      if self.blocks else 0)
+
+    def extend(self, matches):
+        """Adds (offset, length) matches after the last one"""
+        if not matches:
+            return
+        first = max(0, len(self.blocks) - 1)
+        self.rebuild(first, len(self.blocks),
+                     self.block_matches(first, len(self.blocks)) + matches, 0)
+
+    def replace(self, start, end, delta, matches):
+        """
+        Replaces the matches between two offsets with new (offset, length)
+        matches and moves the matches after them by `delta`
+        """
+        if not self.blocks:
+            self.rebuild(0, 0, matches, 0)
+            return
+        first = self.bisect(start)
+        last = self.bisect(end)
+        first_block = self.locate(min(first, self.total - 1))[0]
+        last_block = self.locate(min(last, self.total - 1))[0] + 1
+        old = self.block_matches(first_block, last_block)
+        offset = self.counts[first_block]
+        self.rebuild(first_block, last_block, old[:first - offset] + matches
+                     + [(start + delta, length)
+                        for start, length in old[last - offset:]], delta)
+
+
+class TextSearch():
+    """
+    Finds a literal or regex query in a document
+
+    The document is searched on a worker thread and the matches are added
+    to a `MatchIndex` in batches, `callback` is called on the loop thread
+    after each. After that the editor reports the lines it changes with
+    `lines_changed` and only they are searched again. Matches never have
+    line breaks in them unless the regex asks for them.
+    """
+    def __init__(self, reactor, document, callback):
+        self.reactor = reactor
+        self.document = document
+        self.callback = callback
+
+        self.query = ''
+        self.is_regex = False
+        self.pattern = None
+        self.line_pattern = None
+        self.error = None
+        self.matches = MatchIndex()
+        self.is_done = True
+        self.generation = 0
+        self.length = len(document)
+
+    def set_query(self, query, is_regex):
+        """Starts finding a new query"""
+        old_query, old_pattern = self.query, self.pattern
+        was_regex = self.is_regex
+        self.length = len(self.document)
+        self.query = query
+        self.is_regex = is_regex
+        self.generation += 1
+        self.error = None
+        self.pattern = self.line_pattern = None
+        if query == '':
+            self.matches = MatchIndex()
+            self.is_done = True
+            return
+        try:
+            self.pattern = compile_query(query, is_regex,
+                                         self.document.encoding)
+            self.line_pattern = compile_query(query, is_regex)
+        except re.error as error:
+            self.error = str(error)
+            self.matches = MatchIndex()
+            self.is_done = True
+            return
+        if (is_regex is False and was_regex is False
+                and old_pattern is not None
+                and self.is_done is True and old_query != ''
+                and query.startswith(old_query)
+                and len(self.matches) <= NARROW_LIMIT):
+            self.narrow()
+        else:
+            self.start_scan()
+
+    def narrow(self):
+        """
+        Searches only the lines that had a match of the shorter literal
+        query, the only lines that can have a match of the longer one
+        """
+        document = self.document
+        kept = []
+        line_end = 0
+        for index in range(len(self.matches)):
+            start = self.matches.start(index)
+            if start < line_end:
+                continue
+            line = document.position(start)[0]
+            line_start = document.line_start(line)
+            line_end = (document.line_start(line + 1)
+                        if line + 1 < document.line_count()
+                        else len(document))
+            kept += [(first, last - first) for first, last, _ in
+                     find_all(document, self.pattern, line_start, line_end)]
+        self.matches = MatchIndex()
+        self.matches.extend(kept)
+
+    def start_scan(self):
+        """Searches the whole document on a worker thread"""
+        self.matches = MatchIndex()
+        self.is_done = False
+        self.length = len(self.document)
+        self.reactor.run_in_background(self.scan, self.document.snapshot(),
+                                       self.pattern, self.generation)
+
+    def scan(self, snapshot, pattern, generation):
+        """
+        Finds the matches of a snapshot, called on a worker thread, and
+        stops at the next chunk once a newer search has started
+        """
+        batch = []
+        for position, chunk in chunks(snapshot):
+            if generation != self.generation:
+                return
+            for match in pattern.finditer(chunk):
+                if match.end() == match.start():
+                    continue
+                batch.append((position + match.start(),
+                              match.end() - match.start()))
+                if len(batch) == SEARCH_BATCH:
+                    self.reactor.call_soon_threadsafe(self.found, generation,
+                                                      batch, False)
+                    batch = []
+        self.reactor.call_soon_threadsafe(self.found, generation, batch,
+                                          True)
+
+    def found(self, generation, batch, is_done):
+        """Adds matches that a scan has found"""
+        if generation != self.generation:
+            return
+        self.matches.extend(batch)
+        self.is_done = is_done
+        self.callback()
+
+    def lines_changed(self, start, end):
+        """
+        Searches the text between two offsets again after it has replaced
+        whole lines of the document
+        """
+        delta = len(self.document) - self.length
+        self.length = len(self.document)
+        if self.pattern is None:
+            return
+        if self.is_done is False or end - start > SEARCH_CHUNK:
+            # A scan that has read the document before the edit, or a big
+            # edit, is searched again on a worker thread
+            self.generation += 1
+            self.start_scan()
+            return
+        self.matches.replace(start, end - delta, delta, [
+            (first, last - first)
+            for first, last, _ in find_all(self.document, self.pattern,
+                                           start, end)
+        ])
+
+    def line_matches(self, text):
+        """Returns the (start, end) character indexes of a line's matches"""
+        if self.line_pattern is None:
+            return []
+        return [match.span() for match in self.line_pattern.finditer(text)
+                if match.end() > match.start()]
+
+    def following(self, offset):
+        """
+        Returns the index of the first match after an offset, or of the
+        first match, or None if there is none
+        """
+        if len(self.matches) == 0:
+            return None
+        index = self.matches.bisect(offset + 1)
+        return index if index < len(self.matches) else 0
+
+    def preceding(self, offset):
+        """
+        Returns the index of the last match before an offset, or of the
+        last match, or None if there is none
+        """
+        if len(self.matches) == 0:
+            return None
+        return (self.matches.bisect(offset) - 1) % len(self.matches)
+
+    def replacements(self, snapshot, pattern, replacement, is_regex):
+        """
+        Returns the (start, end, text) ranges that replace every match of a
+        snapshot, called on a worker thread
+        """
+        encoding = snapshot.encoding
+        if is_regex is False:
+            return [(start, end, replacement)
+                    for start, end, _ in find_all(snapshot, pattern)]
+        if encoding is not None:
+            template = replacement.encode(encoding)
+            return [(start, end, match.expand(template).decode(encoding))
+                    for start, end, match in find_all(snapshot, pattern)]
+        return [(start, end, match.expand(replacement))
+                for start, end, match in find_all(snapshot, pattern)]
+
+    def replace_all(self, replacement, callback):
+        """
+        Finds what replaces every match on a worker thread, then makes the
+        replacements in one edit if the document has not changed since, and
+        calls `callback` with how many matches were replaced
+        """
+        if self.pattern is None:
+            return
+        version = self.document.version
+        future = self.reactor.run_in_background(
+            self.replacements, self.document.snapshot(), self.pattern,
+            replacement, self.is_regex
+        )
+        self.reactor.watch_future(future, lambda done: self.replaced(
+            version, callback, done
+        ))
+
+    def replaced(self, version, callback, future):
+        """Makes the replacements that a worker thread has found"""
+        if (future.exception() is not None
+                or version != self.document.version):
+            callback(None)
+            return
+        ranges = future.result()
+        self.document.replace_ranges(ranges)
+        callback(len(ranges))
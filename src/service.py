@@ -0,0 +1,235 @@
+"""Language services in worker processes"""
+import collections
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+def serve(connection):
+    """
+    Runs extension commands for a `LanguageService`, in a worker process
+
+    The worker keeps the lines of every document it has been sent and
+    updates them with the changed line ranges the service sends before a
+    command that needs them.
+    """
+    from .complete import Completion
+    from .extensions import extensions
+
+    commands = {}
+    for extension in extensions:
+        commands.update(extension.commands)
+    documents = {}
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message[0] == 'open':
+            _, document, text = message
+            documents[document] = text.split('\n')
+        elif message[0] == 'edit':
+            _, document, start, stop, lines = message
+            documents[document][start:stop] = lines
+        elif message[0] == 'call':
+            _, request, name, document, args, kwargs = message
+            try:
+                result = commands[name]('\n'.join(documents[document]),
+                                        *args, **kwargs)
+                if name.startswith('editor.auto_complete:'):
+                    result = [Completion(i.name, i.complete, i.type)
+                              for i in result]
+            except Exception as error:  # pylint: disable=broad-except
+                connection.send((request, None, repr(error)))
+            else:
+                connection.send((request, result, None))
+
+
+class Worker():
+    """
+    A worker process, messages to it are sent by a thread so the loop never
+    waits for a busy worker to read them
+    """
+    def __init__(self, context, on_result):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve,
+                                       args=(child_connection,),
+                                       daemon=True)
+        self.process.start()
+        child_connection.close()
+
+        self.outbox = queue.SimpleQueue()
+        self.on_result = on_result
+        self.documents = set()
+        self.request = None
+        threading.Thread(target=self.send_forever, daemon=True).start()
+        threading.Thread(target=self.receive_forever, daemon=True).start()
+
+    def send_forever(self):
+        """Sends the messages of the outbox, snapshots become text here"""
+        while True:
+            message = self.outbox.get()
+            if message is None:
+                return
+            if message[0] == 'open':
+                message = ('open', message[1], message[2].to_string())
+            elif message[0] == 'edit':
+                _, document, start, stop, snapshot, new_stop = message
+                message = ('edit', document, start, stop,
+                           list(snapshot.lines(start, new_stop)))
+            try:
+                self.connection.send(message)
+            except OSError:
+                return
+
+    def receive_forever(self):
+        """Passes the results of the worker on"""
+        while True:
+            try:
+                result = self.connection.recv()
+            except (EOFError, OSError):
+                return
+            self.on_result(self, result)
+
+    def close(self):
+        """Stops the worker"""
+        self.outbox.put(None)
+        self.process.kill()
+        self.connection.close()
+
+
+class LanguageService():
+    """
+    Runs extension commands in a pool of worker processes
+
+    Workers get the text of a document the first time they need it and
+    after that only the range of lines that changed since, which the
+    editor reports with `lines_changed`. A worker runs one request at a
+    time and is killed and started again if a request takes longer than
+    `timeout` seconds. Every request is recorded in `metrics` as a span of
+    the process of its worker.
+    """
+    def __init__(self, reactor, workers, timeout, metrics):
+        self.reactor = reactor
+        self.timeout = timeout
+        self.metrics = metrics
+        self.context = multiprocessing.get_context('spawn')
+        self.workers = [self.start_worker() for _ in range(workers)]
+        self.queue = collections.deque()
+        self.documents = {}
+        self._ids = itertools.count()
+
+    def start_worker(self):
+        """Starts a new worker process"""
+        return Worker(self.context, lambda worker, result:
+                      self.reactor.call_soon_threadsafe(self.finished, worker,
+                                                        result))
+
+    def lines_changed(self, document, line, removed, added):
+        """
+        Remembers that lines `line` to `line + removed` of a document are
+        now lines `line` to `line + added`
+        """
+        if document not in self.documents:
+            return
+        state = self.documents[document]
+        start, stop = line, line + removed + 1
+        new_stop = line + added + 1
+        if state[1] is not None:
+            # Merges with the lines that have changed before
+            old_start, old_stop, old_new_stop = state[1]
+            stop = old_stop + max(0, stop - old_new_stop)
+            new_stop = max(old_new_stop, line + removed + 1) + added - removed
+            start = min(old_start, start)
+        state[1] = (start, stop, new_stop)
+
+    def submit(self, name, document, *args, **kwargs):
+        """
+        Runs command `name` on the text of a document and returns the future
+        of its result
+        """
+        future = Future()
+        self.queue.append((future, name, document, args, kwargs))
+        self.dispatch()
+        return future
+
+    def dispatch(self):
+        """Gives the queued requests to the workers that are free"""
+        free_workers = [i for i in self.workers if i.request is None]
+        while self.queue and free_workers:
+            future, name, document, args, kwargs = self.queue.popleft()
+            if future.set_running_or_notify_cancel() is False:
+                continue
+            worker = free_workers.pop()
+            self.sync(document)
+            request = next(self._ids)
+            document_id = self.documents[document][0]
+            if document_id not in worker.documents:
+                worker.outbox.put(('open', document_id, document.snapshot()))
+                worker.documents.add(document_id)
+            worker.outbox.put(('call', request, name, document_id, args,
+                               kwargs))
+            worker.request = (request, future, self.reactor.call_later(
+                self.timeout, self.timed_out, worker
+            ), name, time.perf_counter())
+
+    def sync(self, document):
+        """Sends the lines of a document that changed to the workers"""
+        if document not in self.documents:
+            self.documents[document] = [next(self._ids), None]
+            return
+        document_id, changed = self.documents[document]
+        if changed is None:
+            return
+        for worker in self.workers:
+            if document_id in worker.documents:
+                worker.outbox.put(('edit', document_id, *changed[:2],
+                                   document.snapshot(), changed[2]))
+        self.documents[document][1] = None
+
+    def finished(self, worker, result):
+        """Resolves the future of a request that a worker has finished"""
+        request, value, error = result
+        if worker.request is None or worker.request[0] != request:
+            return
+        _, future, timer, name, start = worker.request
+        worker.request = None
+        timer.cancel()
+        self.metrics.record(name, start,
+                            None if error is None else {'error': error},
+                            worker.process.pid, 0)
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(RuntimeError(error))
+        self.dispatch()
+
+    def timed_out(self, worker):
+        """Replaces a worker that is taking too long"""
+        _, future, _, name, start = worker.request
+        worker.request = None
+        self.metrics.record(name, start, {'error': 'timed out'},
+                            worker.process.pid, 0)
+        worker.close()
+        self.workers[self.workers.index(worker)] = self.start_worker()
+        future.set_exception(TimeoutError('language service timed out'))
+        self.dispatch()
+
+    def close(self):
+        """Stops the workers"""
+        for worker in self.workers:
+            worker.close()
+
+
+class RemoteCommand():
+    """An extension command that runs in a `LanguageService`"""
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+
+    def submit(self, document, *args, **kwargs):
+        """Runs the command on a document and returns its future"""
+        return self.service.submit(self.name, document, *args, **kwargs)
@@ -2,11 +2,12 @@
 from yachalk import chalk
 from .consts import (
     # Global
-    CTRL_Q, ESC,
+    CTRL_Q, ESC, F5, F6,
     # File System
-    CTRL_N, CTRL_O,
+    CTRL_N, CTRL_O, CTRL_P,
     # Text Editor
-    CTRL_L, F4, END, HOME, LEFT, RIGHT, UP, DOWN, CTRL_V, CTRL_BACKSPACE
+    CTRL_L, F4, END, HOME, LEFT, RIGHT, UP, DOWN, CTRL_V, CTRL_BACKSPACE, TAB,
+    CTRL_S, CTRL_F, CTRL_R, F2, F3, CTRL_Z, CTRL_Y
 )
 
 BOX = '┌┐─│└┘'
@@ -21,7 +22,7 @@ ICONS = {'module': '\uea8b ', 'class': '\ueb5b ',
          'warning': '\uea6c ', 'info': '\uea74 ',
          'folder': '\uea83 ', 'file': '\uea7b ',
          'python': '\ue235 ', 'javascript': '\ue781 ',
-         'home': '\ueb06 '}
+         'home': '\ueb06 ', 'word': '\uea93 '}
 
 CONFIGS = {'menu.start': ' \ue0ba ', 'menu.end': '\ue0b8 ',
            'tab.start': ' \ue0be ', 'tab.end': '\ue0bc ',
@@ -30,12 +31,37 @@ CONFIGS = {'menu.start': ' \ue0ba ', 'menu.end': '\ue0b8 ',
            'editor.use_256_colors': False,
            'editor.line_number_rjust_lenth': 6,
            'editor.line_number_rjust_character': ' ',
+           'editor.lint_delay': 0.3,
+           'editor.completion_delay': 0.05,
+           'editor.max_completions': 6,
+           'editor.mapped_file_size': 32 * 1024 * 1024,
+           'editor.undo_group_delay': 1,
+           'editor.undo_memory': 64 * 1024 * 1024,
            'cursor.blink_time': 0.5,
-           'CSI2J_reload_mode': False,
+           'window.max_fps': 60,
+           'terminal.escape_timeout': 0.05,
+           'terminal.synchronized_output': True,
+           'language_service.workers': 2,
+           'language_service.timeout': 10,
+           'finder.poll_interval': 2,
+           'finder.search_budget': 0.008,
+           'finder.ignored_directories': {'.git', '.hg', '.svn',
+                                          'node_modules', '__pycache__',
+                                          '.venv', 'venv', '.tox',
+                                          '.mypy_cache', '.pytest_cache'},
+           'finder.binary_extensions': {'.pyc', '.pyo', '.so', '.dll',
+                                        '.exe', '.o', '.a', '.class',
+                                        '.jar', '.zip', '.gz', '.tar',
+                                        '.png', '.jpg', '.jpeg', '.gif',
+                                        '.ico', '.pdf', '.woff', '.woff2',
+                                        '.ttf', '.mp3', '.mp4'},
+           'grep.workers': 0,
+           'grep.max_file_hits': 1000,
+           'metrics.max_spans': 200000,
+           'metrics.show_hud': False,
+           'metrics.trace_path': 'strawberry-trace.json',
            'default_encoding': 'utf8'}
 
-# CSI2J_reload_mode may make the screen blink
-
 STYLES = {'menu.unselected': chalk.bg_gray,
           'menu.start.selected': chalk.red,
           'menu.start.unselected': chalk.gray,
@@ -51,20 +77,45 @@ STYLES = {'menu.unselected': chalk.bg_gray,
           'menubox.unselected': chalk.red.bg_gray,
           'menubox.selected': chalk.bg_red.gray,
           'completionbox.color': chalk.magenta.bg_black_bright,
+          'completionbox.selected': chalk.black.bg_magenta,
           'editor.lines.selected': chalk.blue,
           'editor.lines.error': chalk.red,
           'editor.lines.warning': chalk.yellow,
           'editor.lines.info': chalk.cyan,
+          'editor.search_match': chalk.black.bg_yellow,
+          'editor.search_current': chalk.black.bg_yellow_bright,
           'home_page.selected': chalk.magenta_bright,
           'explorer_page.selected': chalk.magenta_bright,
+          'finder_page.selected': chalk.magenta_bright,
+          'finder_page.info': chalk.gray,
+          'grep_page.file': chalk.magenta,
+          'grep_page.selected': chalk.magenta_bright,
+          'grep_page.match': chalk.black.bg_yellow,
+          'grep_page.removed': chalk.red.strikethrough,
+          'grep_page.added': chalk.green,
+          'grep_page.info': chalk.gray,
+          'window.hud': chalk.bg_gray.black,
           'selected_text': chalk.bg_blue}
 
 KEY_BINDINGS = {CTRL_Q: 'exit', ESC: 'toggle_input_mode',
-                CTRL_N: 'new_file', CTRL_O: 'open_file'}
+                CTRL_N: 'new_file', CTRL_O: 'open_file',
+                CTRL_P: 'open_project', F5: 'toggle_hud',
+                F6: 'export_trace'}
 
 EDITOR_KEY_BINDINGS = {'toggle_select_mode': CTRL_L,
                        'toggle_auto_completion': F4,
+                       'accept_completion': TAB,
                        'paste': CTRL_V,
+                       'save': CTRL_S,
+                       'undo': CTRL_Z,
+                       'redo': CTRL_Y,
+                       'find': CTRL_F,
+                       'find_next': F3,
+                       'find_previous': F2,
+                       'toggle_regex': CTRL_R,
+                       'switch_search_field': TAB,
+                       'next_match': DOWN,
+                       'previous_match': UP,
                        'beginning_of_line': HOME,
                        'end_of_line': END,
                        'left': LEFT,
@@ -1,7 +1,14 @@
 """Terminal"""
+import codecs
+import re
+import select
 import sys
 import os
+import threading
+import time
+import unicodedata
 
+from . import consts
 from .settings import CONFIGS
 
 try:
@@ -14,22 +21,380 @@ try:
         return getwch().encode('utf-8', 'replace').decode()
 
 except ImportError:
-    def getch():
+    getch = None
+
+
+CSI = '\033['
+
+ESCAPE_SEQUENCE = re.compile('\033\\[([0-?]*)[ -/]*([@-~])')
+# An escape sequence that is not known, or the Alt + key ones
+KEY_SEQUENCE = re.compile('\033(?:\\[[0-?]*[ -/]*[@-~]|O.|[^\033])?',
+                          re.DOTALL)
+# The start of an escape sequence that has been cut off
+INCOMPLETE_KEY_SEQUENCE = re.compile('\033(?:\\[[0-?]*[ -/]*|O)?')
+READ_SIZE = 65536
+# Asks if the terminal supports synchronized output and its answer
+SYNCHRONIZED_OUTPUT_QUERY = '\033[?2026$p'
+SYNCHRONIZED_OUTPUT_REPORT = re.compile('\033\\[\\?2026;([0-4])\\$y')
+
+DEFAULT_STYLE = (None, None, frozenset())
+BLANK_CELL = (' ', '0')
+
+
+def apply_sgr(style, parameters):
+    """
+    Returns the style after applying the parameters of an SGR sequence to it
+    """
+    foreground, background, attributes = style
+    codes = parameters.replace(':', ';').split(';')
+    index = 0
+    while index < len(codes):
+        code = int(codes[index] or 0)
+        if code in (38, 48):
+            lenth = 3 if codes[index + 1:index + 2] == ['5'] else 5
+            color = ';'.join(codes[index:index + lenth])
+            index += lenth - 1
+            if code == 38:
+                foreground = color
+            else:
+                background = color
+        elif code == 0:
+            foreground, background, attributes = DEFAULT_STYLE
+        elif 30 <= code <= 37 or 90 <= code <= 97:
+            foreground = str(code)
+        elif code == 39:
+            foreground = None
+        elif 40 <= code <= 47 or 100 <= code <= 107:
+            background = str(code)
+        elif code == 49:
+            background = None
+        elif 1 <= code <= 9:
+            attributes = attributes | {code}
+        elif code == 22:
+            attributes = attributes - {1, 2}
+        elif 23 <= code <= 29:
+            attributes = attributes - {code - 20}
+        index += 1
+    return foreground, background, attributes
+
+
+def style_code(style):
+    """Returns the SGR parameters that set a style from scratch"""
+    foreground, background, attributes = style
+    codes = ['0'] + [str(i) for i in sorted(attributes)]
+    if foreground is not None:
+        codes.append(foreground)
+    if background is not None:
+        codes.append(background)
+    return ';'.join(codes)
+
+
+class Screen():
+    """
+    Double buffered grid of cells
+
+    Drawing only changes `back`, the next frame. `render` compares it with
+    `front`, the frame the terminal is showing, and returns the escape
+    sequences that update the cells which changed. A cell is a tuple of
+    (character, SGR parameters of its style).
+    """
+    def __init__(self, cols, lines):
+        self.cols = cols
+        self.lines = lines
+        self.front = []
+        self.back = []
+        self.dirty_lines = set()
+
+        self.left = 0
+        self.top = 0
+        self.style = DEFAULT_STYLE
+        self.code = style_code(DEFAULT_STYLE)
+
+        self.cursor = None
+        self.cursor_is_visible = None
+        self.terminal_position = None
+        self.terminal_code = None
+
+        self.resize(cols, lines)
+
+    def resize(self, cols, lines):
+        """Changes size of the grid and forgets what terminal is showing"""
+        self.cols = cols
+        self.lines = lines
+        self.front = [[None] * cols for _ in range(lines)]
+        self.back = [[BLANK_CELL] * cols for _ in range(lines)]
+        self.dirty_lines = set(range(lines))
+        self.terminal_position = None
+        self.terminal_code = None
+
+    def clear(self):
+        """Clears the next frame"""
+        for line in range(self.lines):
+            self.back[line] = [BLANK_CELL] * self.cols
+        self.dirty_lines.update(range(self.lines))
+        self.style = DEFAULT_STYLE
+        self.code = style_code(DEFAULT_STYLE)
+        self.move(0, 0)
+
+    def clear_line(self, top):
+        """Clears a line of the next frame"""
+        if 0 <= top < self.lines:
+            self.back[top] = [BLANK_CELL] * self.cols
+            self.dirty_lines.add(top)
+        self.style = DEFAULT_STYLE
+        self.code = style_code(DEFAULT_STYLE)
+
+    def move(self, left, top):
+        """Moves position of the next write"""
+        self.left = left
+        self.top = top
+
+    def write(self, text):
+        """Writes text, which may contain SGR sequences, to the next frame"""
+        position = 0
+        for match in ESCAPE_SEQUENCE.finditer(text):
+            self._write_cells(text[position:match.start()])
+            if match.group(2) == 'm':
+                self.style = apply_sgr(self.style, match.group(1))
+                self.code = style_code(self.style)
+            position = match.end()
+        self._write_cells(text[position:])
+
+    def _write_cells(self, text):
+        if text == '' or not 0 <= self.top < self.lines:
+            self.left += len(text)
+            return
+        row = self.back[self.top]
+        cell = None
+        left = self.left
+        for char in text:
+            if char < ' ':
+                continue
+            wide = (char >= '\u1100'
+                    and unicodedata.east_asian_width(char) in 'WF')
+            if 0 <= left < self.cols:
+                self._free_cell(row, left)
+                if wide and left + 1 < self.cols:
+                    self._free_cell(row, left + 1)
+                    row[left + 1] = ('', self.code)
+                elif wide:
+                    # Half of a wide character would not fit on the line
+                    char = ' '
+                cell = (char, self.code)
+                row[left] = cell
+            left += 2 if wide else 1
+        if cell is not None:
+            self.dirty_lines.add(self.top)
+        self.left = left
+
+    def _free_cell(self, row, left):
         """
-        Gets a single character from STDIO.
+        Blanks the other half of a wide character before one of its cells
+        is written over, the terminal would not show a half of it
         """
-        import tty
-        import termios
-        file_no = sys.stdin.fileno()
-        old = termios.tcgetattr(file_no)
-        try:
-            tty.setraw(file_no)
-            return sys.stdin.read(1)
-        finally:
-            termios.tcsetattr(file_no, termios.TCSADRAIN, old)
+        if row[left][0] == '':
+            row[left - 1] = (' ', row[left - 1][1])
+        elif left + 1 < self.cols and row[left + 1][0] == '':
+            row[left + 1] = (' ', row[left + 1][1])
 
+    def _render_cell(self, output, back, front, left):
+        """Appends the output of a cell and returns the column after it"""
+        char, code = back[left]
+        if code != self.terminal_code:
+            output.append(f'{CSI}{code}m')
+            self.terminal_code = code
+        output.append(char)
+        front[left] = back[left]
+        left += 1
+        if left < self.cols and back[left][0] == '':
+            front[left] = back[left]
+            left += 1
+        return left
 
-CSI = '\033['
+    def render(self):
+        """
+        Returns the output that makes the terminal show the next frame
+        """
+        output = []
+        for top in sorted(self.dirty_lines):
+            back = self.back[top]
+            front = self.front[top]
+            if back == front:
+                continue
+            left = 0
+            while left < self.cols:
+                if back[left] == front[left]:
+                    left += 1
+                    continue
+                position = self.terminal_position
+                if (position is not None and position[1] == top
+                        and 0 < left - position[0] <= 4
+                        and back[position[0]][0] != ''):
+                    # Rewriting a few cells is shorter than moving there
+                    skipped = position[0]
+                    while skipped < left:
+                        skipped = self._render_cell(output, back, front,
+                                                    skipped)
+                elif position != (left, top):
+                    output.append(f'{CSI}{top + 1};{left + 1}H')
+                while left < self.cols and back[left] != front[left]:
+                    left = self._render_cell(output, back, front, left)
+                self.terminal_position = ((left, top) if left < self.cols
+                                          else None)
+        self.dirty_lines.clear()
+
+        if self.cursor is None:
+            if self.cursor_is_visible is not False:
+                output.append(f'{CSI}?25l')
+                self.cursor_is_visible = False
+        else:
+            if self.terminal_position != self.cursor:
+                output.append(f'{CSI}{self.cursor[1] + 1};'
+                              f'{self.cursor[0] + 1}H')
+                self.terminal_position = self.cursor
+            if self.cursor_is_visible is not True:
+                output.append(f'{CSI}?25h')
+                self.cursor_is_visible = True
+        return ''.join(output)
+
+
+class FrameWriter():
+    """
+    Collects the output of a frame and sends it with a single write
+
+    When `is_synchronized` is True the frame is sent between the begin and
+    end synchronized update sequences, so the terminal shows it all at
+    once. `frames`, `bytes_written` and `write_time` count every frame and
+    `frame_bytes` and `frame_write_time` are of the last one.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.frame = bytearray()
+        self.is_synchronized = False
+
+        self.frames = 0
+        self.bytes_written = 0
+        self.write_time = 0
+        self.frame_bytes = 0
+        self.frame_write_time = 0
+
+    def write(self, text):
+        """Adds text to the frame"""
+        self.frame += text.encode('utf-8')
+
+    def flush(self):
+        """Sends the frame"""
+        if not self.frame:
+            return
+        if self.is_synchronized is True:
+            self.frame[:0] = f'{CSI}?2026h'.encode()
+            self.frame += f'{CSI}?2026l'.encode()
+        start = time.perf_counter()
+        if sys.platform.startswith('win'):
+            # The console only decodes text written through sys.stdout
+            self.file.write(self.frame.decode('utf-8'))
+            self.file.flush()
+        else:
+            self._write_all(self.file.fileno(), memoryview(self.frame))
+        self.frame_write_time = time.perf_counter() - start
+        self.frame_bytes = len(self.frame)
+        self.frames += 1
+        self.bytes_written += self.frame_bytes
+        self.write_time += self.frame_write_time
+        self.frame = bytearray()
+
+    @staticmethod
+    def _write_all(descriptor, data):
+        # STDOUT shares the non-blocking mode of STDIN on a terminal
+        while data:
+            try:
+                data = data[os.write(descriptor, data):]
+            except BlockingIOError:
+                select.select([], [descriptor], [])
+
+
+class KeyParser():
+    """
+    Splits the text read from a terminal into keys
+
+    The escape sequences of `consts` are looked up in a trie, other CSI and
+    SS3 sequences are kept whole and an ESC with any other character after
+    it is an Alt + key. A sequence that is cut off at the end of a read is
+    kept in `pending` until more text comes, or `flush` gives it out as a
+    key once the ESC timeout has passed.
+
+    Text between `PASTE_START` and `PASTE_END` is given out as one key,
+    with the two sequences around it, however many reads it comes in.
+    """
+    def __init__(self, sequences):
+        self.trie = {}
+        for sequence in sequences:
+            node = self.trie
+            for char in sequence:
+                node = node.setdefault(char, {})
+            node[''] = sequence
+        self.pending = ''
+        self.paste = None
+
+    def _key_end(self, text, start):
+        """
+        Returns where the key at `start` ends, or None if the text ends in
+        the middle of it
+        """
+        if text[start] != consts.ESC:
+            return start + 1
+        if INCOMPLETE_KEY_SEQUENCE.fullmatch(text, start):
+            return None
+        node = self.trie
+        end = position = start
+        while position < len(text) and text[position] in node:
+            node = node[text[position]]
+            position += 1
+            if '' in node:
+                end = position
+        if end - start > 1:
+            return end
+        return KEY_SEQUENCE.match(text, start).end()
+
+    def feed(self, text):
+        """Returns the keys that are complete after `text` is read"""
+        text = self.pending + text
+        keys = []
+        position = 0
+        while position < len(text):
+            if self.paste is not None:
+                end = text.find(consts.PASTE_END, position)
+                if end == -1:
+                    # The end of the text can be the start of PASTE_END
+                    end = max(position,
+                              len(text) - len(consts.PASTE_END) + 1)
+                    self.paste.append(text[position:end])
+                    position = end
+                    break
+                self.paste.append(text[position:end])
+                keys.append(consts.PASTE_START + ''.join(self.paste)
+                            + consts.PASTE_END)
+                self.paste = None
+                position = end + len(consts.PASTE_END)
+                continue
+            end = self._key_end(text, position)
+            if end is None:
+                break
+            if text[position:end] == consts.PASTE_START:
+                self.paste = []
+            else:
+                keys.append(text[position:end])
+            position = end
+        self.pending = text[position:]
+        return keys
+
+    def flush(self):
+        """Returns the cut off sequence as a key"""
+        if self.paste is not None:
+            return []
+        keys = [self.pending] if self.pending else []
+        self.pending = ''
+        return keys
 
 
 class TerminalWindow():
@@ -42,26 +407,92 @@ class TerminalWindow():
         cls.terminal_lines = os.get_terminal_size().lines
         cls.terminal_cols = os.get_terminal_size().columns
 
-        cls.write = sys.stdout.write
-        cls.flush = sys.stdout.flush
-
     def start_terminal(self):
         """Runs at start of terminal"""
-        sys.stdout.write(f"{CSI}?1049h")
+        self.screen = Screen(self.terminal_cols, self.terminal_lines)
+        self.frame_writer = FrameWriter(sys.stdout)
+        self.terminal_attributes = None
+        if self.is_os_windows is False:
+            import tty
+            import termios
+            self.terminal_attributes = termios.tcgetattr(sys.stdin.fileno())
+            tty.setraw(sys.stdin.fileno())
+            os.set_blocking(sys.stdin.fileno(), False)
+            if CONFIGS['terminal.synchronized_output'] is True:
+                self.frame_writer.write(SYNCHRONIZED_OUTPUT_QUERY)
+        self.frame_writer.write(f"{CSI}?1049h{CSI}?2004h")
+        self.frame_writer.flush()
 
     def end_terminal(self):
         """Runs at end of terminal"""
-        sys.stdout.write(f"{CSI}?1049l")
+        self.frame_writer.is_synchronized = False
+        self.frame_writer.write(f"{CSI}0m{CSI}?25h{CSI}?2004l{CSI}?1049l")
+        self.frame_writer.flush()
+        if self.terminal_attributes is not None:
+            import termios
+            os.set_blocking(sys.stdin.fileno(), True)
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN,
+                              self.terminal_attributes)
+
+    def read_keys(self, reactor, callback):
+        """Calls `callback` on the reactor with every key that is pressed"""
+        if self.is_os_windows is True:
+            def read_forever():
+                while True:
+                    reactor.call_soon_threadsafe(callback, self.getch())
+            threading.Thread(target=read_forever, daemon=True).start()
+        else:
+            self.input_decoder = codecs.getincrementaldecoder('utf-8')(
+                'replace'
+            )
+            self.key_parser = KeyParser(
+                value for value in vars(consts).values()
+                if isinstance(value, str) and value.startswith(consts.ESC)
+            )
+            self.escape_timer = None
+            reactor.add_reader(sys.stdin.fileno(),
+                               lambda: self.read_input(reactor, callback))
+
+    def read_input(self, reactor, callback):
+        """
+        Reads everything STDIN has and passes the keys in it to `callback`
+        """
+        try:
+            data = os.read(sys.stdin.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        if data == b'':
+            reactor.remove_reader(sys.stdin.fileno())
+            return
+        if self.escape_timer is not None:
+            self.escape_timer.cancel()
+            self.escape_timer = None
+        for key in self.key_parser.feed(self.input_decoder.decode(data)):
+            report = SYNCHRONIZED_OUTPUT_REPORT.fullmatch(key)
+            if report is not None:
+                # 1 and 2 mean that the mode is supported
+                self.frame_writer.is_synchronized = report.group(1) in '12'
+            else:
+                callback(key)
+        if self.key_parser.pending:
+            self.escape_timer = reactor.call_later(
+                CONFIGS['terminal.escape_timeout'], self.flush_input,
+                callback
+            )
+
+    def flush_input(self, callback):
+        """Passes a cut off escape sequence on as a key once it times out"""
+        self.escape_timer = None
+        for key in self.key_parser.flush():
+            callback(key)
 
     def getch(self):
-        """Gets a key from STDIO"""
+        """Gets a key from STDIO on Windows"""
         char1 = getch()
-        if char1 not in '\x00\xe0' + ('\x1b' if self.is_os_windows is False
-                                      else ''):
+        if char1 not in '\x00\xe0':
             return char1
         char2 = getch()
-        if char2 not in '\x5b' + ('\x4f' if self.is_os_windows is False
-                                  else ''):
+        if char2 != '\x5b':
             if char1 == '\xe0':
                 return '\x00' + char2
             return char1 + char2
@@ -76,29 +507,37 @@ class TerminalWindow():
 
     def clear_terminal(self):
         """
-        Clears Terminal
+        Clears the next frame
         """
-        if CONFIGS['CSI2J_reload_mode'] is True:
-            sys.stdout.write(f'{CSI}2J')
-        else:
-            self.move_cursor(0, 0)
-            sys.stdout.write(' ' * self.terminal_cols * self.terminal_lines)
-            self.move_cursor(0, 0)
+        self.screen.clear()
 
     def move_cursor(self, left, top):
         """
-        Moves cursor's position
+        Moves position of the next write
+        """
+        self.screen.move(left, top)
+
+    def write(self, text):
+        """
+        Writes text to the next frame
         """
-        sys.stdout.write(f'{CSI}{top + 1};{left + 1}H')
+        self.screen.write(text)
 
     def hide_cursor(self):
         """
         Hides cursor
         """
-        sys.stdout.write(f'{CSI}?25l')
+        self.screen.cursor = None
 
-    def show_cursor(self):
+    def show_cursor(self, left, top):
         """
-        Hides cursor
+        Shows cursor at a position
+        """
+        self.screen.cursor = (left, top)
+
+    def refresh(self):
+        """
+        Sends the changes of the next frame to the terminal
         """
-        sys.stdout.write(f'{CSI}?25h')
+        self.frame_writer.write(self.screen.render())
+        self.frame_writer.flush()
@@ -0,0 +1,129 @@
+"""Undoing and redoing edits"""
+import collections
+import time
+
+from .settings import CONFIGS
+
+# Estimated bytes of memory that a range and a piece of an edit hold, the
+# text of the pieces is in the buffers of the document and is not counted
+RANGE_SIZE = 120
+PIECE_SIZE = 80
+
+
+def edit_size(ranges):
+    """Returns the estimated memory of the ranges of an edit"""
+    return (len(ranges) * RANGE_SIZE
+            + sum(len(pieces) for _, _, pieces in ranges) * PIECE_SIZE)
+
+
+class UndoHistory():
+    """
+    The edits of a document as the ranges of pieces that undo them
+
+    A `Document` passes every edit it makes to `record` as a sorted list of
+    (start, end, pieces) ranges, which `Document.splice` applies to go back.
+    The pieces point into the buffers of the document, so an edit costs
+    the same however much text it changes and a big file is never copied.
+    Typing and deleting next to the last edit within
+    `editor.undo_group_delay` seconds joins it, and the oldest edits are
+    forgotten once they hold more than `editor.undo_memory` bytes.
+    """
+    def __init__(self, document):
+        self.document = document
+        document.history = self
+
+        self.undo_stack = collections.deque()
+        self.redo_stack = collections.deque()
+        self.size = 0
+        self.last_time = 0
+        self.is_sealed = True
+
+    def record(self, ranges):
+        """Keeps the ranges that undo an edit the document has made"""
+        for edit in self.redo_stack:
+            self.size -= edit_size(edit)
+        self.redo_stack.clear()
+        now = time.monotonic()
+        if (self.is_sealed is False
+                and now - self.last_time < CONFIGS['editor.undo_group_delay']
+                and self.join(ranges) is True):
+            self.last_time = now
+            return
+        self.undo_stack.append(ranges)
+        self.size += edit_size(ranges)
+        self.last_time = now
+        self.is_sealed = False
+        self.forget()
+
+    def join(self, ranges):
+        """
+        Joins an edit with the last one if it types or deletes right next
+        to it, returns True if it has
+        """
+        last = self.undo_stack[-1]
+        if len(last) != 1 or len(ranges) != 1:
+            return False
+        start, end, pieces = last[0]
+        new_start, new_end, new_pieces = ranges[0]
+        deleted = sum(stop - begin for _, begin, stop, _ in new_pieces)
+        if new_start == end and not new_pieces:
+            # Typing after the text of the last edit
+            joined = (start, new_end, pieces)
+        elif (new_start == new_end and start <= new_start
+              and new_start + deleted == end):
+            # Deleting the end of the text the last edit typed
+            joined = (start, new_start, pieces)
+        elif start == end == new_start == new_end:
+            # Deleting the text after the text the last edit deleted
+            joined = (start, start, pieces + new_pieces)
+        elif (start == end and new_start == new_end
+              and new_start + deleted == start):
+            # Deleting the text before the text the last edit deleted
+            joined = (new_start, new_start, new_pieces + pieces)
+        else:
+            return False
+        self.size += edit_size([joined]) - edit_size(last)
+        self.undo_stack[-1] = [joined]
+        return True
+
+    def seal(self):
+        """Makes the next edit a step of its own"""
+        self.is_sealed = True
+
+    def forget(self):
+        """
+        Forgets the oldest edits while they use more than the budget, the
+        last edit that was made or undone is always kept
+        """
+        budget = CONFIGS['editor.undo_memory']
+        while (self.size > budget
+               and len(self.undo_stack) + len(self.redo_stack) > 1):
+            stack = self.undo_stack if self.undo_stack else self.redo_stack
+            self.size -= edit_size(stack.popleft())
+
+    def apply(self, ranges, stack):
+        """Makes an edit and keeps the ranges that undo it in `stack`"""
+        inverse = self.document.splice(ranges)
+        stack.append(inverse)
+        self.size += edit_size(inverse) - edit_size(ranges)
+        self.is_sealed = True
+        self.forget()
+        return ranges, inverse
+
+    def undo(self):
+        """
+        Undoes the last edit and returns the ranges it applied and the
+        ranges that redo it, or None if there is nothing to undo
+        """
+        if not self.undo_stack:
+            return None
+        return self.apply(self.undo_stack.pop(), self.redo_stack)
+
+    def redo(self):
+        """
+        Redoes the last undone edit and returns the ranges it applied and
+        the ranges that undo it, or None if there is nothing to redo
+        """
+        if not self.redo_stack:
+            return None
+        return self.apply(self.redo_stack.pop(), self.undo_stack)
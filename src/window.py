@@ -1,19 +1,27 @@
 """Window"""
+import multiprocessing
 import os
 import time
-import threading
+from concurrent.futures import ProcessPoolExecutor
 import yachalk
 
 from .settings import STYLES, CONFIGS, KEY_BINDINGS, ICONS
 from .menus import Strawberry, File, Edit
 from .edit import TextEditor
+from .document import MappedBuffer
 from .extensions import extensions
-from .consts import LEFT, RIGHT, UP, DOWN, ENTER
+from .consts import LEFT, RIGHT, UP, DOWN, ENTER, PASTE_START, PASTE_END
 from .terminal import TerminalWindow
+from .reactor import Reactor
+from .service import LanguageService
+from .words import WordIndex
+from .metrics import Metrics, TimedCommand
 
 BLOCK_CURSOR = yachalk.chalk.bg_white_bright.black
 UNDERLINE_CURSOR = yachalk.chalk.underline
 
+# The directory the editor was started in, the project of the finder
+PROJECT_PATH = os.getcwd()
 os.chdir(os.path.join(os.path.dirname(__file__), 'extensions'))
 
 
@@ -36,13 +44,21 @@ class Window(TerminalWindow):
         self.can_show_cursor = True
 
         self.extension_commands = {}
+        self.project_path = PROJECT_PATH
+
+        self.reactor = Reactor(on_error=self.callback_failed)
+        self.language_service = None
+        self.process_pool = None
+        self.words = WordIndex()
+        self.redraw_timer = None
+        self.last_draw_time = 0
+        self.damage = True
+        self.drawn_page = None
+        self.metrics = Metrics(CONFIGS['metrics.max_spans'])
+        self.show_hud = CONFIGS['metrics.show_hud']
+        self.hud_status = ''
+        self.hud_width = 0
 
-        self.t_wait_for_exit = None
-        self.d_keypress = None
-        self.d_draw = None
-        self.d_cursor = None
-
-        self.can_redraw = True
         self.kill = False
 
     def enter(self):
@@ -50,13 +66,22 @@ class Window(TerminalWindow):
         self.start_terminal()
 
         for i in extensions:
-            self.extension_commands.update(i.commands)
+            self.extension_commands.update(
+                (name, TimedCommand(self.metrics, name, command))
+                for name, command in i.commands.items()
+            )
+        if CONFIGS['language_service.workers'] > 0:
+            self.language_service = LanguageService(
+                self.reactor, CONFIGS['language_service.workers'],
+                CONFIGS['language_service.timeout'], self.metrics
+            )
 
         self.tabs.append(self.extension_commands['home_page.page'](self))
 
     def exit(self):
         """Runs at end of program"""
         self.kill = True
+        self.reactor.stop()
 
     def toggle_input_mode(self):
         """Toggles between input mode"""
@@ -64,7 +89,7 @@ class Window(TerminalWindow):
 
     def new_file(self):
         """Makes a new file"""
-        self.tabs.append(TextEditor(self, 'Untitled', ''))
+        self.tabs.append(TextEditor(self, None, ''))
         self.current_tab = len(self.tabs) - 1
 
     def open_file(self):
@@ -72,97 +97,212 @@ class Window(TerminalWindow):
         self.tabs.append(self.extension_commands['explorer_page.page'](self))
         self.current_tab = len(self.tabs) - 1
 
+    def open_project(self):
+        """Opens the finder of the project"""
+        self.tabs.append(self.extension_commands['finder_page.page'](
+            self, PROJECT_PATH
+        ))
+        self.current_tab = len(self.tabs) - 1
+
+    def search_files(self, path):
+        """Opens the search of the files of a directory"""
+        self.tabs.append(self.extension_commands['grep_page.page'](self, path))
+        self.current_tab = len(self.tabs) - 1
+
+    def search_pool(self):
+        """
+        Returns the worker processes that search files, which are started
+        the first time they are needed
+        """
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(
+                CONFIGS['grep.workers'] or os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self.process_pool
+
+    def toggle_hud(self):
+        """Shows or hides the timings on the tab bar"""
+        self.show_hud = not self.show_hud
+
+    def export_trace(self):
+        """Writes the recorded timings to `metrics.trace_path`"""
+        path = os.path.join(PROJECT_PATH, CONFIGS['metrics.trace_path'])
+        self.show_hud = True
+        self.hud_status = f'Writing {path}'
+        future = self.reactor.run_in_background(self.metrics.export, path)
+        self.reactor.watch_future(future,
+                                  lambda done: self.trace_exported(path, done))
+
+    def trace_exported(self, path, future):
+        """Shows where the timings were written"""
+        if future.exception() is not None:
+            self.hud_status = f'Could not write {path}: {future.exception()}'
+        else:
+            self.hud_status = f'Wrote {future.result()} spans to {path}'
+        self.request_redraw()
+
+    def callback_failed(self, callback, error):
+        """Shows the error of a callback of the loop instead of exiting"""
+        name = getattr(callback, '__qualname__', type(callback).__name__)
+        self.show_hud = True
+        self.hud_status = f'{name} failed: {type(error).__name__}: {error}'
+        self.invalidate()
+
+    def open_path(self, file_path):
+        """Opens a file in a new tab, big files are mapped"""
+        encoding = CONFIGS['default_encoding']
+        if os.path.getsize(file_path) >= CONFIGS['editor.mapped_file_size']:
+            text = MappedBuffer(file_path, encoding)
+        else:
+            with open(file_path, 'r', encoding=encoding) as file:
+                text = file.read()
+        self.tabs.append(TextEditor(self, file_path, text))
+        self.current_tab = len(self.tabs) - 1
+
+    def invalidate(self):
+        """Marks the whole window as changed"""
+        self.damage = True
+        self.request_redraw()
+
+    def request_redraw(self):
+        """
+        Asks for the window to be drawn, at most `window.max_fps` times
+        per second
+        """
+        if self.redraw_timer is None:
+            delay = (self.last_draw_time + 1 / CONFIGS['window.max_fps']
+                     - time.monotonic())
+            self.redraw_timer = self.reactor.call_later(max(0, delay),
+                                                        self.draw)
+
     def draw(self):
         """
-        Draws the window
+        Draws what has changed since the last frame
+        """
+        self.redraw_timer = None
+        self.last_draw_time = time.monotonic()
+        start = time.perf_counter()
+        frames = self.frame_writer.frames
+        current_tab = self.tabs[self.current_tab]
+        page_damage = current_tab.take_damage()
+        if (self.damage is True or page_damage is True
+                or current_tab is not self.drawn_page
+                or self.is_menu_opened is True):
+            self.draw_window(current_tab)
+        elif page_damage:
+            for line in page_damage:
+                self.screen.clear_line(line)
+            current_tab.__draw_lines__(page_damage)
+        if self.show_hud is True:
+            self.draw_hud()
+        self.draw_cursor(current_tab)
+        self.metrics.frame_drawn(start, self.frame_writer.frame_bytes
+                                 if self.frame_writer.frames != frames
+                                 else 0)
+
+    def draw_window(self, current_tab):
         """
-        self.hide_cursor()
-        while True:
-            self.clear_terminal()
-            self.write(STYLES['menu.bg_color'](' ' * self.terminal_cols))
-            self.move_cursor(0, 0)
-            for menu_index, menu in enumerate(self.menus):
-                if menu_index == 0:
-                    self.write(STYLES['menu.start.selected' if
-                                      self.current_menu == 0 else
-                                      'menu.start.unselected']
-                               (CONFIGS['menu.start']))
-                if menu_index == self.current_menu:
-                    self.write(STYLES['menu.selected'](f' {menu.name} '))
-                else:
-                    self.write(STYLES['menu.unselected'](f' {menu.name} '))
-            self.move_cursor(self.terminal_cols - len(CONFIGS['tab.end'])
-                             - len(CONFIGS['selected_circle' if self.on_tab is
-                                   True and self.input_mode is False else
-                                   'unselected_circle']), 0)
-            self.write(STYLES['tab.bg_color'](CONFIGS['selected_circle' if
-                                              self.on_tab is False and
-                                              self.input_mode is False else
-                                              'unselected_circle']))
-            self.write(STYLES['menu.end.unselected'](CONFIGS['menu.end']))
-
-            self.move_cursor(0, self.terminal_lines - 1)
-            self.write(STYLES['tab.bg_color'](' ' * self.terminal_cols))
-            self.move_cursor(0, self.terminal_lines - 1)
-            for tab_index, tab in enumerate(self.tabs):
-                if tab_index == 0:
-                    self.write((STYLES['tab.start.selected'] if
-                               self.current_tab == 0 else
-                               STYLES['tab.start.unselected'])(CONFIGS
-                                                               ['tab.start']))
-                if tab_index == self.current_tab:
-                    self.write(STYLES['tab.selected'](
-                        f' {ICONS[tab.icon]}{tab.name} ')
-                    )
-                else:
-                    self.write(STYLES['tab.unselected'](f' {ICONS[tab.icon]}'
-                                                        + f'{tab.name} '))
-            self.move_cursor(self.terminal_cols - len(CONFIGS['tab.end'])
-                             - len(CONFIGS['selected_circle' if self.on_tab is
-                                   True and self.input_mode is False else
-                                   'unselected_circle']),
-                             self.terminal_lines - 1)
-            self.write(STYLES['tab.bg_color'](CONFIGS['selected_circle' if
-                                              self.on_tab is True and
-                                              self.input_mode is False else
-                                              'unselected_circle']))
-            self.write(STYLES['tab.end.unselected'](CONFIGS['tab.end']))
-
-            if self.is_menu_opened is True:
-                left = len(''.join([f' {i.name} ' for i in
-                                    self.menus[:self.current_menu]])) + 3
-                self.move_cursor(left, 1)
-                items = self.menus[self.current_menu].list
-                try:
-                    max_len_items = len(max(items, key=len)) + 1
-                    max_len_items = max(max_len_items, 10)
-                except ValueError:
-                    max_len_items = 0
-                for enum, i in enumerate(items):
-                    text = ' ' + i.ljust(max_len_items, ' ')
-                    self.write(STYLES['menubox.unselected' if enum != self.
-                               current_menu_item else 'menubox.selected']
-                               (text))
-                    self.move_cursor(left, 2 + enum)
-                self.hide_cursor()
-
-            self.move_cursor(0, 0)
-            current_tab = self.tabs[self.current_tab]
-            current_tab.__draw__()
-
-            cursor_pos = current_tab.__cursor__()['position']
-            cursor_is_hidden = current_tab.__cursor__()['is_hidden']
-
-            if cursor_is_hidden is False:
-                if self.can_show_cursor is True:
-                    self.show_cursor()
-                else:
-                    self.hide_cursor()
-                self.move_cursor(cursor_pos[0], cursor_pos[1] + 1)
+        Draws the whole window
+        """
+        self.damage = False
+        self.drawn_page = current_tab
+        self.hud_width = 0
+
+        self.clear_terminal()
+        self.write(STYLES['menu.bg_color'](' ' * self.terminal_cols))
+        self.move_cursor(0, 0)
+        for menu_index, menu in enumerate(self.menus):
+            if menu_index == 0:
+                self.write(STYLES['menu.start.selected' if
+                                  self.current_menu == 0 else
+                                  'menu.start.unselected']
+                           (CONFIGS['menu.start']))
+            if menu_index == self.current_menu:
+                self.write(STYLES['menu.selected'](f' {menu.name} '))
+            else:
+                self.write(STYLES['menu.unselected'](f' {menu.name} '))
+        self.move_cursor(self.terminal_cols - len(CONFIGS['tab.end'])
+                         - len(CONFIGS['selected_circle' if self.on_tab is
+                               True and self.input_mode is False else
+                               'unselected_circle']), 0)
+        self.write(STYLES['tab.bg_color'](CONFIGS['selected_circle' if
+                                          self.on_tab is False and
+                                          self.input_mode is False else
+                                          'unselected_circle']))
+        self.write(STYLES['menu.end.unselected'](CONFIGS['menu.end']))
+
+        self.move_cursor(0, self.terminal_lines - 1)
+        self.write(STYLES['tab.bg_color'](' ' * self.terminal_cols))
+        self.move_cursor(0, self.terminal_lines - 1)
+        for tab_index, tab in enumerate(self.tabs):
+            if tab_index == 0:
+                self.write((STYLES['tab.start.selected'] if
+                           self.current_tab == 0 else
+                           STYLES['tab.start.unselected'])(CONFIGS
+                                                           ['tab.start']))
+            if tab_index == self.current_tab:
+                self.write(STYLES['tab.selected'](
+                    f' {ICONS[tab.icon]}{tab.name} ')
+                )
             else:
-                self.hide_cursor()
+                self.write(STYLES['tab.unselected'](f' {ICONS[tab.icon]}'
+                                                    + f'{tab.name} '))
+        self.move_cursor(self.terminal_cols - len(CONFIGS['tab.end'])
+                         - len(CONFIGS['selected_circle' if self.on_tab is
+                               True and self.input_mode is False else
+                               'unselected_circle']),
+                         self.terminal_lines - 1)
+        self.write(STYLES['tab.bg_color'](CONFIGS['selected_circle' if
+                                          self.on_tab is True and
+                                          self.input_mode is False else
+                                          'unselected_circle']))
+        self.write(STYLES['tab.end.unselected'](CONFIGS['tab.end']))
+
+        if self.is_menu_opened is True:
+            left = len(''.join([f' {i.name} ' for i in
+                                self.menus[:self.current_menu]])) + 3
+            self.move_cursor(left, 1)
+            items = self.menus[self.current_menu].list
+            try:
+                max_len_items = len(max(items, key=len)) + 1
+                max_len_items = max(max_len_items, 10)
+            except ValueError:
+                max_len_items = 0
+            for enum, i in enumerate(items):
+                text = ' ' + i.ljust(max_len_items, ' ')
+                self.write(STYLES['menubox.unselected' if enum != self.
+                           current_menu_item else 'menubox.selected']
+                           (text))
+                self.move_cursor(left, 2 + enum)
+            self.hide_cursor()
+
+        self.move_cursor(0, 0)
+        current_tab.__draw__()
+
+    def draw_hud(self):
+        """
+        Draws the timings of the last frames at the end of the tab bar, over
+        the longer text that was there before
+        """
+        text = self.hud_status or self.metrics.hud()
+        self.hud_width = max(self.hud_width, len(text) + 2)
+        left = max(0, self.terminal_cols - len(CONFIGS['tab.end'])
+                   - len(CONFIGS['unselected_circle']) - self.hud_width)
+        self.move_cursor(left, self.terminal_lines - 1)
+        self.write(STYLES['window.hud'](f' {text} '.rjust(self.hud_width)))
 
-            self.flush()
+    def draw_cursor(self, current_tab):
+        """Places the cursor of the current tab and refreshes the terminal"""
+        cursor_pos = current_tab.__cursor__()['position']
+        cursor_is_hidden = current_tab.__cursor__()['is_hidden']
+
+        if cursor_is_hidden is False and self.can_show_cursor is True:
+            self.show_cursor(cursor_pos[0], cursor_pos[1] + 1)
+        else:
+            self.hide_cursor()
+
+        self.refresh()
 
     def execute_command(self, command):
         """Executes commands"""
@@ -174,91 +314,95 @@ class Window(TerminalWindow):
                 self.toggle_input_mode()
             elif i == 'open_file':
                 self.open_file()
+            elif i == 'open_project':
+                self.open_project()
             elif i == 'new_file':
                 self.new_file()
+            elif i == 'toggle_hud':
+                self.toggle_hud()
+            elif i == 'export_trace':
+                self.export_trace()
             elif i in self.extension_commands:
                 self.extension_commands[i]()
 
-    def key_press(self):
+    def key_press(self, key):
         """Handels keypresses"""
-        while True:
-            key = self.getch()
-            self.can_show_cursor = True
-            if key in KEY_BINDINGS:
-                self.is_menu_opened = False
-                self.execute_command(KEY_BINDINGS[key])
-            elif (key in self.tabs[self.current_tab].keys and
-                  self.input_mode is True):
-                self.tabs[self.current_tab].keys[key]()
-            elif self.input_mode is True:
-                self.tabs[self.current_tab].keys[None](key)
-            elif key == LEFT and self.input_mode is False:
-                if self.current_tab > 0 and self.on_tab is True:
-                    self.current_tab -= 1
-                elif self.current_menu > 0 and self.on_tab is False:
-                    self.current_menu -= 1
-            elif key == RIGHT and self.input_mode is False:
-                if self.current_tab < len(self.tabs) - 1 and (self.on_tab
-                                                              is True):
-                    self.current_tab += 1
-                elif self.current_menu < len(self.menus) - 1 and (self.on_tab
-                                                                  is False):
-                    self.current_menu += 1
-            elif (key == UP and self.on_tab is False and self.input_mode is
-                  False and self.is_menu_opened is True):
-                self.current_menu_item -= 1
-            elif (key == DOWN and self.on_tab is False and
-                  self.input_mode is False and self.is_menu_opened is True):
-                self.current_menu_item += 1
-            elif key == UP and self.input_mode is False:
-                if self.on_tab is True:
-                    self.on_tab = False
-            elif key == DOWN and self.input_mode is False:
-                if self.on_tab is False:
-                    self.on_tab = True
-            elif (key == ENTER and self.on_tab is False and self.input_mode is
-                  False):
-                if self.is_menu_opened is False:
-                    self.is_menu_opened = True
-                else:
-                    (self.menus[self.current_menu].exec[self.current_menu_item]
-                     (self))
+        start = time.perf_counter()
+        self.can_show_cursor = True
+        self.hud_status = ''
+        if key.startswith(PASTE_START):
+            if self.input_mode is True:
+                self.tabs[self.current_tab].__event_paste__(
+                    key[len(PASTE_START):-len(PASTE_END)]
+                )
+        elif key in KEY_BINDINGS:
+            self.is_menu_opened = False
+            self.execute_command(KEY_BINDINGS[key])
+        elif (key in self.tabs[self.current_tab].keys and
+              self.input_mode is True):
+            self.tabs[self.current_tab].keys[key]()
+        elif self.input_mode is True:
+            self.tabs[self.current_tab].keys[None](key)
+        elif key == LEFT and self.input_mode is False:
+            if self.current_tab > 0 and self.on_tab is True:
+                self.current_tab -= 1
+            elif self.current_menu > 0 and self.on_tab is False:
+                self.current_menu -= 1
+        elif key == RIGHT and self.input_mode is False:
+            if self.current_tab < len(self.tabs) - 1 and (self.on_tab
+                                                          is True):
+                self.current_tab += 1
+            elif self.current_menu < len(self.menus) - 1 and (self.on_tab
+                                                              is False):
+                self.current_menu += 1
+        elif (key == UP and self.on_tab is False and self.input_mode is
+              False and self.is_menu_opened is True):
+            self.current_menu_item -= 1
+        elif (key == DOWN and self.on_tab is False and
+              self.input_mode is False and self.is_menu_opened is True):
+            self.current_menu_item += 1
+        elif key == UP and self.input_mode is False:
+            if self.on_tab is True:
+                self.on_tab = False
+        elif key == DOWN and self.input_mode is False:
+            if self.on_tab is False:
+                self.on_tab = True
+        elif (key == ENTER and self.on_tab is False and self.input_mode is
+              False):
+            if self.is_menu_opened is False:
+                self.is_menu_opened = True
             else:
-                self.is_menu_opened = False
+                (self.menus[self.current_menu].exec[self.current_menu_item]
+                 (self))
+        else:
+            self.is_menu_opened = False
+
+        if self.input_mode is False or key in KEY_BINDINGS:
+            self.invalidate()
+        else:
+            self.request_redraw()
+        self.metrics.key_pressed(start)
 
     def cursor(self):
         """Cursor blink controller"""
-        while True:
-            self.can_show_cursor = True
-            time.sleep(CONFIGS['cursor.blink_time'])
-            self.can_show_cursor = False
-            time.sleep(CONFIGS['cursor.blink_time'])
-
-    def wait_for_exit(self):
-        """A Function that waits for system exit and then kills all daemon"""
-        while self.kill is False:
-            pass
-        try:
-            self.can_redraw = False
-            self.show_cursor()
-            self.clear_terminal()
-            self.end_terminal()
-        except Exception as exc:
-            raise Exception from exc
-        os.kill(os.getpid(), 0)
+        self.can_show_cursor = not self.can_show_cursor
+        self.request_redraw()
+        self.reactor.call_later(CONFIGS['cursor.blink_time'], self.cursor)
 
     def main_loop(self):
         """
         Starts the loop
         """
         self.enter()
-
-        self.t_wait_for_exit = threading.Thread(target=self.wait_for_exit)
-        self.d_keypress = threading.Thread(target=self.key_press, daemon=True)
-        self.d_draw = threading.Thread(target=self.draw, daemon=True)
-        self.d_cursor = threading.Thread(target=self.cursor, daemon=True)
-
-        self.t_wait_for_exit.start()
-        self.d_keypress.start()
-        self.d_draw.start()
-        self.d_cursor.start()
+        self.read_keys(self.reactor, self.key_press)
+        self.reactor.call_later(CONFIGS['cursor.blink_time'], self.cursor)
+        self.request_redraw()
+        try:
+            self.reactor.run()
+        finally:
+            self.end_terminal()
+            if self.language_service is not None:
+                self.language_service.close()
+            if self.process_pool is not None:
+                self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.reactor.close()
@@ -0,0 +1,156 @@
+"""Words of the open documents"""
+import bisect
+import heapq
+import re
+import sys
+
+WORD = re.compile(r'[^\W\d]\w{2,}')
+# How many of the most common words are kept for a prefix
+TOP_SIZE = 16
+# Prefixes of fewer words are completed by walking the trie every time
+TOP_MIN_WORDS = 256
+# A (-count, word) pair after the pair of every word
+LAST = (0, '')
+
+
+def line_words(text):
+    """Returns the words of a line"""
+    return tuple(sys.intern(i) for i in WORD.findall(text))
+
+
+class WordIndex():
+    """
+    Counts the words of every open document in a trie
+
+    A node of the trie is a dict from a character to the next node, the
+    count of the word that ends at a node is kept under the empty string.
+
+    The most common words of a prefix with more than `TOP_MIN_WORDS` words
+    are kept in `tops` once they are looked up, as a sorted list of at most
+    `TOP_SIZE` (-count, word) pairs and the floor, the smallest pair of the
+    other words or `LAST` when there are none. `add` and `remove` keep them
+    up to date and the words of a prefix are only walked again when too few
+    of the kept pairs are below the floor.
+    """
+    def __init__(self):
+        self.root = {}
+        self.tops = {}
+
+    def add(self, words, count=1):
+        """Adds `count` to the counts of words"""
+        for word in words:
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[''] = node.get('', 0) + count
+            if self.tops:
+                self.update_tops(word, node[''])
+
+    def remove(self, words):
+        """Removes one from the counts of words and forgets unused nodes"""
+        for word in words:
+            path = [self.root]
+            for char in word:
+                path.append(path[-1][char])
+            path[-1][''] -= 1
+            if self.tops:
+                self.update_tops(word, path[-1][''])
+            if path[-1][''] == 0:
+                del path[-1]['']
+            for index in range(len(word), 0, -1):
+                if path[index]:
+                    break
+                del path[index - 1][word[index - 1]]
+
+    def update_tops(self, word, count):
+        """Updates the kept words of the prefixes of a word to its count"""
+        for end in range(len(word) + 1):
+            top = self.tops.get(word[:end])
+            if top is None:
+                continue
+            words, floor = top
+            for index, (_, kept) in enumerate(words):
+                if kept == word:
+                    del words[index]
+                    break
+            else:
+                if (-count, word) >= floor:
+                    continue
+            if count > 0:
+                bisect.insort(words, (-count, word))
+            if len(words) > TOP_SIZE:
+                top[1] = min(floor, words.pop())
+
+    def count(self, word):
+        """Returns how many times a word is in the open documents"""
+        node = self.root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return 0
+        return node.get('', 0)
+
+    def complete(self, prefix, limit):
+        """
+        Returns the `limit` most common words that start with `prefix`,
+        without `prefix` itself, words as common are sorted by name
+        """
+        top = self.tops.get(prefix)
+        if top is not None and limit < TOP_SIZE:
+            words, floor = top
+            found = [pair for pair in words if pair[1] != prefix][:limit]
+            if ((len(found) == limit or floor == LAST)
+                    and all(pair < floor for pair in found)):
+                return [word for _, word in found]
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        words = []
+        stack = [(prefix, node)]
+        while stack:
+            word, node = stack.pop()
+            for char, child in node.items():
+                if char == '':
+                    words.append((-child, word))
+                else:
+                    stack.append((word + char, child))
+        if len(words) > TOP_MIN_WORDS:
+            best = heapq.nsmallest(TOP_SIZE + 1, words)
+            self.tops[prefix] = [best[:TOP_SIZE],
+                                 best[TOP_SIZE] if len(best) > TOP_SIZE
+                                 else LAST]
+        return [word for _, word in heapq.nsmallest(limit + 1, words)
+                if word != prefix][:limit]
+
+
+class DocumentWords():
+    """
+    Keeps the words of each line of a document in a `WordIndex`, so an
+    edit only counts the words of the lines it has changed
+    """
+    def __init__(self, index, document):
+        self.index = index
+        self.document = document
+        self.lines = [line_words(i)
+                      for i in document.to_string().split('\n')]
+        counts = {}
+        for words in self.lines:
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+        for word, count in counts.items():
+            index.add((word,), count)
+
+    def lines_changed(self, line, removed, added):
+        """
+        Counts the words again after lines `line` to `line + removed` were
+        replaced with lines `line` to `line + added`
+        """
+        new_lines = [line_words(self.document.line(i))
+                     for i in range(line, line + added + 1)]
+        for words in self.lines[line:line + removed + 1]:
+            self.index.remove(words)
+        for words in new_lines:
+            self.index.add(words)
+        self.lines[line:line + removed + 1] = new_lines
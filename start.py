@@ -2,6 +2,7 @@
 
 from src import window
 
-editor = window.Window()
+if __name__ == '__main__':
+    editor = window.Window()
 
-editor.main_loop()
+    editor.main_loop()